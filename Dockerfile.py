@@ -13,8 +13,12 @@ RUN pip install --no-cache-dir -r requirements.txt
 # Copier le contenu du répertoire local dans le répertoire de travail du conteneur
 COPY . .
 
+# Stockage persistant des analyses (volume pour le conserver d'un conteneur à l'autre)
+ENV ANALYSE_STORE_DIR=/data/analyses
+VOLUME /data
+
 # Exposer le port sur lequel Streamlit fonctionne
 EXPOSE 8501
 
-# Définir la commande de démarrage par défaut
-CMD ["streamlit", "run", "site3.py", "--server.port=8501", "--server.address=0.0.0.0"]
+# Définir la commande de démarrage par défaut (envois jusqu'à 4 Go pour le mode flux)
+CMD ["streamlit", "run", "site3.py", "--server.port=8501", "--server.address=0.0.0.0", "--server.maxUploadSize=4096"]
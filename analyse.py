@@ -0,0 +1,640 @@
+import csv
+import hashlib
+import multiprocessing
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from mesures import stage
+from ngrammes import count_ngrams_by_sentiment, empty_ngram_counts, merge_ngram_counts
+
+# Liste de stopwords personnalisés (y compris les articles et pronoms)
+stop_words = set([
+    'le', 'la', 'les', 'un', 'une', 'des', 'de', 'du', 'dans', 'en', 'et', 'à',
+    'au', 'aux', 'ce', 'cet', 'cette', 'cela', 'ça', 'sur', 'pour', 'par',
+    'avec', 'sans', 'sous', 'qui', 'que', 'quoi', 'dont', 'où', 'est', 'sont',
+    'être', 'avoir', 'faire', 'comme', 'plus', 'moins', 'très', 'bien', 'mal',
+    'je', 'tu', 'il', 'elle', 'nous', 'vous', 'ils', 'elles', 'me', 'te', 'se',
+    'moi', 'toi', 'lui', 'leur', 'eux'
+])
+
+# Repliement des accents : table str.translate précalculée pour les lettres latines accentuées
+# (décomposition NFKD sans les diacritiques, plus les ligatures), puis NFKD complet pour les
+# rares mots qui contiennent encore des caractères non ASCII. « déçu » et « decu » deviennent
+# ainsi le même mot.
+def _build_fold_table():
+    table = {}
+    for code in range(0xC0, 0x250):
+        folded = ''.join(char for char in unicodedata.normalize('NFKD', chr(code)) if not unicodedata.combining(char))
+        if folded != chr(code) and folded and not any(char.isspace() for char in folded):
+            table[code] = folded
+    table.update(str.maketrans({'œ': 'oe', 'Œ': 'OE', 'æ': 'ae', 'Æ': 'AE', 'ß': 'ss', 'ø': 'o', 'Ø': 'O', 'ł': 'l', 'Ł': 'L', 'đ': 'd', 'Đ': 'D'}))
+    return table
+
+_FOLD_TABLE = _build_fold_table()
+
+# Fonction pour replier les accents d'un mot (les espaces issus de la décomposition sont retirés)
+def fold_accents(word):
+    word = word.translate(_FOLD_TABLE)
+    if word.isascii():
+        return word
+    return ''.join(char for char in unicodedata.normalize('NFKD', word) if not unicodedata.combining(char) and not char.isspace())
+
+_PONCTUATION = re.compile(r'[^\w\s]')
+
+# Fonction pour normaliser un mot : minuscules, accents repliés et caractères spéciaux supprimés
+def normalize_word(word):
+    return _PONCTUATION.sub('', fold_accents(word.lower()))
+
+# Fonction pour normaliser une expression mot par mot (sans retirer les stopwords)
+def normalize_text(text):
+    return " ".join(filter(None, map(normalize_word, text.split())))
+
+# Les stopwords sont normalisés comme les commentaires (« à » devient « a », « où » devient « ou »)
+stop_words = {normalize_word(word) for word in stop_words}
+
+# Fonction pour nettoyer un mot isolé (chaîne vide s'il doit disparaître)
+def _clean_word(word):
+    word = normalize_word(word)
+    return '' if word in stop_words else word
+
+# Marqueur de fin de proposition : la ponctuation qui sépare deux propositions (« pas cher, mais
+# horrible ») est remplacée par ce mot, qui ne peut pas apparaître dans un mot normalisé
+CLAUSE_MARK = ','
+_PROPOSITION = re.compile(r'[,;:.!?…()]+')
+
+# Fonction pour nettoyer un mot en gardant ses ponctuations de fin de proposition comme marqueurs
+def _clean_word_with_clauses(word, clean_word):
+    if not _PROPOSITION.search(word):
+        return clean_word(word)
+    return " ".join(f" {CLAUSE_MARK} ".join(map(clean_word, _PROPOSITION.split(word))).split())
+
+# Fonction pour normaliser un commentaire (stopwords conservés) en marquant les fins de proposition
+def mark_clauses(comment):
+    words = (_clean_word_with_clauses(word, normalize_word) for word in comment.lower().split())
+    return " ".join(filter(None, words))
+
+# Fonction pour nettoyer le texte
+def clean_comment(comment):
+    words = comment.lower().split()  # Mise en minuscule, puis normalisation de chaque mot
+    cleaned_words = [word for word in map(_clean_word, words) if word]  # Suppression des stopwords
+    return " ".join(cleaned_words)
+
+# Nettoyage en bloc : toute la colonne est concaténée avec un séparateur (\x00)
+# et découpée en mots une seule fois. Comme la normalisation ne crée ni ne
+# fusionne de mots, chaque mot distinct n'est nettoyé (minuscule, accents
+# repliés, regex précompilée, stopwords) qu'une seule fois, puis la table
+# obtenue est appliquée en bloc à tous les mots. Le résultat est identique à
+# clean_comment.
+_SEPARATEUR = '\x00'
+
+# Fonction pour nettoyer une colonne entière de commentaires (remove_stopwords=False ne fait
+# que normaliser les mots, comme normalize_text ; clauses=True garde les fins de proposition,
+# comme mark_clauses)
+def clean_comments(comments, remove_stopwords=True, clauses=False):
+    comments = comments.astype(str)
+    if len(comments) == 0:
+        return pd.Series([], index=comments.index, dtype=object)
+    values = comments.tolist()
+    text = _SEPARATEUR.join(values)
+    if text.count(_SEPARATEUR) != len(values) - 1:
+        # Le séparateur est de toute façon supprimé par clean_comment (après la mise en minuscule)
+        text = _SEPARATEUR.join(value.lower().replace(_SEPARATEUR, '') for value in values)
+    words = text.replace(_SEPARATEUR, ' \x00 ').split()
+    clean_word = _clean_word if remove_stopwords else normalize_word
+    if clauses:
+        table = {word: _clean_word_with_clauses(word, clean_word) for word in set(words)}
+    else:
+        table = {word: clean_word(word) for word in set(words)}
+    table[_SEPARATEUR] = _SEPARATEUR
+    text = " ".join(filter(None, map(table.__getitem__, words)))
+    text = text.replace(' \x00', _SEPARATEUR).replace('\x00 ', _SEPARATEUR)
+    return pd.Series(text.split(_SEPARATEUR), index=comments.index, dtype=object)
+
+# Lexique pondéré des sentiments, chargé une seule fois depuis un fichier CSV extensible
+# (mot,poids ; lignes commençant par # ignorées). ANALYSE_LEXIQUE permet d'en désigner un autre.
+LEXICON_PATH = os.environ.get('ANALYSE_LEXIQUE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lexique_sentiments.csv'))
+
+# Mots de négation : ils inversent le poids du premier mot du lexique qui les suit dans la fenêtre
+# (stopwords non comptés), sans dépasser la fin de la proposition
+NEGATIONS = {'pas', 'jamais', 'aucun', 'aucune', 'rien', 'ni'}
+NEGATION_WINDOW = 3
+
+# Fonction pour charger un lexique pondéré (les mots sont normalisés comme les commentaires)
+def load_lexicon(path=LEXICON_PATH):
+    with open(path, encoding='utf-8', newline='') as f:
+        rows = csv.DictReader(line for line in f if not line.startswith('#'))
+        return {normalize_word(row['mot'].strip()): float(row['poids']) for row in rows}
+
+# Fonction pour calculer l'empreinte d'un lexique : les analyses enregistrées avec un autre lexique
+# ne sont pas resservies
+def lexicon_fingerprint(path=LEXICON_PATH):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+sentiment_lexicon = load_lexicon()
+LEXICON_FINGERPRINT = lexicon_fingerprint()
+positive_words = {word for word, weight in sentiment_lexicon.items() if weight > 0}
+negative_words = {word for word, weight in sentiment_lexicon.items() if weight < 0}
+
+# Fonction pour calculer le score d'un commentaire normalisé (mark_clauses) en un seul passage sur ses mots
+def score_sentiment(comment):
+    score = 0.0
+    negated = 0
+    for word in comment.split():
+        if word == CLAUSE_MARK:
+            negated = 0
+        elif word in stop_words:
+            continue
+        elif word in NEGATIONS:
+            negated = NEGATION_WINDOW
+        elif word in sentiment_lexicon:
+            weight = sentiment_lexicon[word]
+            score += -weight if negated else weight
+            negated = 0
+        elif negated:
+            negated -= 1
+    return score
+
+# Fonction pour convertir un score en sentiment
+def sentiment_label(score):
+    return 'positif' if score > 0 else 'négatif' if score < 0 else 'neutre'
+
+# Fonction pour analyser le sentiment d'un commentaire brut
+def analyze_sentiment(comment):
+    return sentiment_label(score_sentiment(mark_clauses(comment)))
+
+# Score en bloc d'une colonne de commentaires normalisés (clean_comments(..., remove_stopwords=False,
+# clauses=True)) : tous les mots sont mis bout à bout (séparés par un marqueur \x00 entre
+# commentaires) et numérotés par mot distinct, les stopwords sont écartés ; poids, négations et
+# fins de proposition sont lus une fois par mot distinct. Un mot du lexique est inversé si la
+# dernière négation qui le précède est à moins de NEGATION_WINDOW mots et qu'aucune fin de
+# commentaire ou de proposition ni aucun autre mot du lexique ne les sépare ; les poids sont
+# ensuite sommés par commentaire. Le résultat est identique à score_sentiment.
+def score_comments(normalized):
+    words = f" {_SEPARATEUR} ".join(normalized.tolist()).split()
+    codes, vocabulary = pd.factorize(np.asarray(words, dtype=object))
+    codes = codes[~np.array([word in stop_words for word in vocabulary], dtype=bool)[codes]]
+    weights = np.array([sentiment_lexicon.get(word, 0.0) for word in vocabulary], dtype=np.float64)[codes]
+    is_lexicon = np.array([word in sentiment_lexicon for word in vocabulary], dtype=bool)[codes]
+    is_negation = np.array([word in NEGATIONS for word in vocabulary], dtype=bool)[codes]
+    is_marker = np.array([word == _SEPARATEUR for word in vocabulary], dtype=bool)[codes]
+    is_clause = np.array([word == CLAUSE_MARK for word in vocabulary], dtype=bool)[codes]
+    positions = np.arange(len(codes))
+    last_negation = np.maximum.accumulate(np.where(is_negation, positions, -1)) if len(codes) else positions
+    # Dernière barrière strictement avant chaque mot : fin de commentaire, de proposition ou mot du lexique
+    barriers = np.where(is_marker | is_clause | is_lexicon, positions, -1)
+    last_barrier = np.concatenate([[-1], np.maximum.accumulate(barriers)[:-1]]) if len(codes) else positions
+    negated = is_lexicon & (last_negation > last_barrier) & (positions - last_negation <= NEGATION_WINDOW)
+    signed = np.where(negated, -weights, weights)
+    return np.bincount(np.cumsum(is_marker), weights=signed, minlength=len(normalized))
+
+# Fonction pour convertir une colonne de scores en sentiments
+def sentiment_labels(scores):
+    return np.select([scores > 0, scores < 0], ['positif', 'négatif'], 'neutre').astype(object)
+
+# Expressions signalant une opportunité d'amélioration
+opportunity_phrases = [
+    'ajouter', 'il manque', 'améliorer', 'optimiser', 'perfectionner',
+    'corriger', 'compléter', 'renforcer', 'adapter', 'modifier',
+    'développer', 'mettre à jour', 'plus rapide', 'plus fluide',
+    'réduire les bugs', 'stabiliser', 'augmenter l\'efficacité',
+    'améliorer la vitesse', 'diminuer la latence', 'rendre plus durable',
+    'meilleure finition', 'plus solide', 'haute qualité', 'résoudre les défauts',
+    'plus fiable', 'inclure', 'intégrer', 'proposer davantage de choix',
+    'ajouter une fonctionnalité', 'enrichir le contenu', 'ajouter des détails',
+    'plus d\'options', 'personnaliser', 'simplifier', 'rendre plus intuitif',
+    'faciliter', 'plus ergonomique', 'améliorer l\'accessibilité',
+    'réduire la complexité', 'clarifier', 'améliorer l\'esthétique',
+    'moderniser', 'mettre en valeur', 'plus attrayant', 'revoir le design',
+    'ajouter des couleurs', 'rendre plus clair', 'réduire le coût',
+    'proposer des promotions', 'améliorer le rapport qualité-prix',
+    'plus compétitif', 'rendre plus abordable', 'rapide', 'lent'
+]
+
+# Construction d'un automate d'Aho-Corasick : chaque état porte une table de
+# transitions complète (les liens d'échec sont déjà résolus) et la liste des
+# expressions qui se terminent à cet état. Un caractère absent des expressions
+# ramène toujours à l'état initial. Les expressions sont normalisées comme les
+# commentaires (stopwords compris) et encadrées d'espaces pour ne reconnaître que des
+# mots entiers, mais l'automate renvoie leur forme d'origine.
+def _build_automaton(phrases):
+    transitions = [{}]
+    outputs = [[]]
+    for phrase in phrases:
+        state = 0
+        for char in f" {normalize_text(phrase)} ":
+            if char not in transitions[state]:
+                transitions.append({})
+                outputs.append([])
+                transitions[state][char] = len(transitions) - 1
+            state = transitions[state][char]
+        if phrase not in outputs[state]:
+            outputs[state].append(phrase)
+    # Liens d'échec calculés en largeur, les sorties des états d'échec sont héritées
+    failures = [0] * len(transitions)
+    order = []
+    queue = deque(transitions[0].values())
+    while queue:
+        state = queue.popleft()
+        order.append(state)
+        for char, target in transitions[state].items():
+            failure = failures[state]
+            while failure and char not in transitions[failure]:
+                failure = failures[failure]
+            failures[target] = transitions[failure].get(char, 0)
+            outputs[target] += [phrase for phrase in outputs[failures[target]] if phrase not in outputs[target]]
+            queue.append(target)
+    # Compléter chaque table avec les transitions de son état d'échec
+    for state in order:
+        for char, target in transitions[failures[state]].items():
+            transitions[state].setdefault(char, target)
+    return transitions, outputs
+
+_TRANSITIONS, _OUTPUTS = _build_automaton(opportunity_phrases)
+
+# Fonction pour trouver, en une seule passe, toutes les expressions d'opportunité présentes
+# dans un commentaire normalisé (mark_clauses, stopwords conservés)
+def match_opportunities(comment):
+    transitions = _TRANSITIONS
+    outputs = _OUTPUTS
+    state = 0
+    matches = []
+    for char in f" {comment} ":
+        state = transitions[state].get(char, 0)
+        if outputs[state]:
+            for phrase in outputs[state]:
+                if phrase not in matches:
+                    matches.append(phrase)
+    return matches
+
+# Fonction pour détecter les opportunités d'amélioration
+def detect_opportunities(comment):
+    return bool(match_opportunities(comment))
+
+# Fonction pour compter des éléments pondérés : chaque groupe (liste de mots ou d'expressions)
+# compte autant de fois que sa multiplicité, sans modifier l'ordre de première apparition
+def weighted_counter(groups, weights=None):
+    counts = Counter(chain.from_iterable(groups))
+    if weights is not None:
+        for items, weight in zip(groups, weights):
+            if weight > 1:
+                for item in items:
+                    counts[item] += int(weight) - 1
+    return counts
+
+# Fonction pour compter les mots de chaque sentiment sans construire de chaîne concaténée :
+# les mots sont parcourus une seule fois, groupe de sentiment par groupe de sentiment.
+# weights donne la multiplicité de chaque ligne (commentaires dédoublonnés).
+def count_words_by_sentiment(words, sentiments, weights=None):
+    counts = {sentiment: Counter() for sentiment in ['positif', 'négatif', 'neutre']}
+    if weights is not None:
+        weights = pd.Series(weights, index=words.index)
+    for sentiment, group in words.groupby(sentiments, sort=False):
+        counter = counts.setdefault(sentiment, Counter())
+        counter.update(chain.from_iterable(map(str.split, group)))
+        if weights is not None:
+            group_weights = weights.loc[group.index]
+            repeated = group_weights > 1
+            for text, weight in zip(group[repeated], group_weights[repeated]):
+                for word in text.split():
+                    counter[word] += int(weight) - 1
+    return counts
+
+# Fonction pour nettoyer et classer des commentaires distincts (exécutée aussi dans les processus)
+def _analyze_texts(texts):
+    with stage('nettoyage', len(texts)):
+        cleaned = clean_comments(texts)
+        # Texte normalisé avec ses stopwords et ses fins de proposition, pour les négations
+        # et les expressions qui contiennent des stopwords (« il manque », « mettre à jour »)
+        normalized = clean_comments(texts, remove_stopwords=False, clauses=True)
+    with stage('sentiment', len(texts)):
+        scores = score_comments(normalized)
+        sentiments = sentiment_labels(scores)
+    with stage('opportunites', len(texts)):
+        expressions = normalized.apply(match_opportunities)
+    return pd.DataFrame({
+        'Mots_Essentiels': cleaned,
+        'Sentiment': sentiments,
+        'Score': scores,
+        'Expressions_Opportunité': expressions,
+        'Opportunité': expressions.str.len() > 0,
+    })
+
+# Fonction pour compter les mots par sentiment, les expressions et les n-grammes de commentaires
+# distincts déjà analysés, pondérés par leur multiplicité
+def _count_texts(analyzed, weights):
+    with stage('compteurs', len(analyzed)):
+        # Comptage des mots-clés par sentiment en une seule passe sur les mots
+        sentiment_word_counts = count_words_by_sentiment(analyzed['Mots_Essentiels'], analyzed['Sentiment'], weights)
+        # Fréquence de chaque expression (nombre de commentaires qui la contiennent)
+        phrase_counts = weighted_counter(analyzed['Expressions_Opportunité'], weights)
+    with stage('ngrammes', len(analyzed)):
+        # Bigrammes et trigrammes les plus fréquents par sentiment, dans des compteurs à mémoire bornée
+        ngram_counts = count_ngrams_by_sentiment(analyzed['Mots_Essentiels'], analyzed['Sentiment'], SENTIMENTS, weights)
+    return {'sentiment_word_counts': sentiment_word_counts, 'phrase_counts': phrase_counts, 'ngram_counts': ngram_counts}
+
+# Fonction pour analyser et compter une tranche de commentaires distincts dans un processus :
+# seuls les compteurs de la tranche reviennent au processus principal, qui les fusionne
+def _analyze_shard(texts, weights):
+    analyzed = _analyze_texts(texts)
+    return analyzed, _count_texts(analyzed, weights)
+
+# Fonction pour analyser un DataFrame de commentaires : colonnes enrichies et compteurs de mots.
+# Les commentaires identiques ne sont analysés qu'une fois : chaque texte distinct est analysé,
+# puis les résultats sont recopiés sur les lignes via l'index inverse et les compteurs
+# pondérés par le nombre de répétitions. Avec un executor, les textes distincts sont
+# répartis en tranches sur ses processus, qui comptent aussi leurs mots, expressions et n-grammes.
+def analyze_comments(df, executor=None, workers=1):
+    df = df.copy()
+    # Dédoublonnage des commentaires (table de hachage) : codes = index inverse vers les textes distincts.
+    # Les cellules vides deviennent des commentaires vides (factorize leur donnerait le code -1)
+    with stage('dedoublonnage', len(df)):
+        codes, uniques = pd.factorize(df['Commentaire'].fillna('').astype(str))
+        texts = pd.Series(uniques, dtype=object)
+        multiplicity = np.bincount(codes, minlength=len(texts))
+    # Nettoyer les commentaires, extraire les mots essentiels, le sentiment et les opportunités
+    if executor is None or workers <= 1 or len(texts) == 0:
+        analyzed = _analyze_texts(texts)
+        parts = [_count_texts(analyzed, multiplicity)]
+    else:
+        size = -(-len(texts) // workers)
+        starts = range(0, len(texts), size)
+        with stage('analyse_parallele', len(texts)):
+            shards = list(executor.map(_analyze_shard, [texts.iloc[start:start + size] for start in starts],
+                                       [multiplicity[start:start + size] for start in starts]))
+        analyzed = pd.concat([shard for shard, _ in shards])
+        parts = [counts for _, counts in shards]
+    for column in analyzed.columns:
+        df[column] = analyzed[column].to_numpy()[codes]
+    with stage('fusion_compteurs', len(parts)):
+        sentiment_word_counts = {sentiment: Counter() for sentiment in SENTIMENTS}
+        phrase_counts = Counter()
+        for part in parts:
+            for sentiment, counts in part['sentiment_word_counts'].items():
+                sentiment_word_counts.setdefault(sentiment, Counter()).update(counts)
+            phrase_counts.update(part['phrase_counts'])
+        ngram_counts = merge_ngram_counts([part['ngram_counts'] for part in parts]) if len(parts) > 1 else parts[0]['ngram_counts']
+        # Comptage des mots-clés sur l'ensemble des commentaires : somme des compteurs par sentiment
+        word_counts = Counter()
+        for counts in sentiment_word_counts.values():
+            word_counts.update(counts)
+    return {
+        'df': df,
+        'rows': len(df),
+        'unique_rows': len(texts),
+        'sentiment_counts': Counter(df['Sentiment']),
+        'good_word_counts': sentiment_word_counts['positif'],
+        'bad_word_counts': sentiment_word_counts['négatif'],
+        'word_counts': word_counts,
+        'phrase_counts': phrase_counts,
+        'ngram_counts': ngram_counts,
+    }
+
+# Colonnes ajoutées par l'analyse au DataFrame d'origine
+ANALYSIS_COLUMNS = ['Mots_Essentiels', 'Sentiment', 'Score', 'Expressions_Opportunité', 'Opportunité']
+
+# Compteurs fusionnés d'un bloc à l'autre lors d'une analyse en flux
+COUNTER_KEYS = ['sentiment_counts', 'good_word_counts', 'bad_word_counts', 'word_counts', 'phrase_counts']
+
+# En dessous de ce nombre de lignes, le démarrage des processus coûte plus qu'il ne rapporte
+PARALLEL_MIN_ROWS = 20000
+
+# Nombre de processus par défaut : un par cœur disponible
+def default_workers():
+    return os.cpu_count() or 1
+
+# Pool de processus pour l'analyse parallèle ('spawn' plutôt que 'fork' : le serveur Streamlit est multithreadé)
+def create_executor(workers):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+# Fonction pour analyser un DataFrame en répartissant les commentaires distincts sur plusieurs
+# processus ; les petits fichiers (ou workers <= 1) sont analysés en série.
+def analyze_comments_parallel(df, workers=None, min_rows=PARALLEL_MIN_ROWS, executor=None):
+    workers = workers or default_workers()
+    if workers <= 1 or len(df) < min_rows:
+        return analyze_comments(df)
+    if executor is None:
+        with create_executor(workers) as pool:
+            return analyze_comments(df, pool, workers)
+    return analyze_comments(df, executor, workers)
+
+# Nombre de bits de l'empreinte qui choisissent le registre du comptage approché des commentaires
+# distincts (2**14 registres, soit 16 Ko et environ 1 % d'erreur)
+DISTINCT_BITS = 14
+
+# Fonction pour ajouter des commentaires au comptage approché des commentaires distincts (HyperLogLog) :
+# chaque registre garde le plus long préfixe de zéros des empreintes qui y tombent
+def update_distinct(registers, comments):
+    hashes = pd.util.hash_array(comments.fillna('').astype(str).to_numpy(dtype=object))
+    rest = hashes & np.uint64((1 << (64 - DISTINCT_BITS)) - 1)
+    high = np.frexp((rest >> np.uint64(32)).astype(np.float64))[1]
+    low = np.frexp((rest & np.uint64(0xFFFFFFFF)).astype(np.float64))[1]
+    bit_length = np.where(high > 0, high + 32, low)
+    np.maximum.at(registers, (hashes >> np.uint64(64 - DISTINCT_BITS)).astype(np.intp),
+                  (64 - DISTINCT_BITS - bit_length + 1).astype(np.uint8))
+    return registers
+
+# Fonction pour estimer le nombre de commentaires distincts à partir des registres
+# (comptage linéaire des registres vides pour les petits nombres)
+def estimate_distinct(registers):
+    m = len(registers)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+    empty = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and empty:
+        estimate = m * np.log(m / empty)
+    return int(round(estimate))
+
+# Fonction pour analyser un CSV volumineux bloc par bloc : seule la colonne Commentaire est lue,
+# les compteurs de chaque bloc sont fusionnés et seul un aperçu borné des lignes est conservé
+# (sample_size commentaires par sentiment et autant d'opportunités), si bien que la mémoire
+# dépend de chunksize et non de la taille du fichier
+def analyze_csv_in_chunks(source, chunksize=100000, sample_size=1000, on_chunk=None, workers=1):
+    totals = {key: Counter() for key in COUNTER_KEYS}
+    quotas = {'positif': sample_size, 'négatif': sample_size, 'neutre': sample_size, 'opportunité': sample_size}
+    samples = []
+    ngram_counts = None
+    rows = 0
+    # Commentaires distincts sur tout le fichier (un même commentaire peut revenir d'un bloc à l'autre)
+    distinct = np.zeros(2 ** DISTINCT_BITS, dtype=np.uint8)
+    executor = create_executor(workers) if workers > 1 and chunksize >= PARALLEL_MIN_ROWS else None
+    try:
+        for chunk in pd.read_csv(source, usecols=['Commentaire'], chunksize=chunksize):
+            results = analyze_comments_parallel(chunk, workers, executor=executor)
+            for key in COUNTER_KEYS:
+                totals[key].update(results[key])
+            ngram_counts = merge_ngram_counts([ngram_counts, results['ngram_counts']])
+            enriched = results['df']
+            for sentiment in ['positif', 'négatif', 'neutre']:
+                kept = enriched[enriched['Sentiment'] == sentiment].head(quotas[sentiment])
+                quotas[sentiment] -= len(kept)
+                samples.append(kept)
+            kept = enriched[enriched['Opportunité']].head(quotas['opportunité'])
+            quotas['opportunité'] -= len(kept)
+            samples.append(kept)
+            rows += len(chunk)
+            update_distinct(distinct, chunk['Commentaire'])
+            if on_chunk is not None:
+                on_chunk(rows)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    df = pd.concat(samples) if samples else pd.DataFrame(columns=['Commentaire'])
+    df = df[~df.index.duplicated()].sort_index()
+    return {'df': df, 'rows': rows, 'unique_rows': min(estimate_distinct(distinct), rows), 'preview': True,
+            'ngram_counts': ngram_counts or empty_ngram_counts(SENTIMENTS), **totals}
+
+# Sentiments possibles, dans l'ordre des catégories de la colonne Sentiment compacte
+SENTIMENTS = ['positif', 'négatif', 'neutre']
+
+# Fonction pour encoder les mots essentiels en identifiants entiers d'un vocabulaire partagé ;
+# les mots de la ligne i sont vocabulary[ids[offsets[i]:offsets[i + 1]]]
+def encode_tokens(words):
+    token_lists = [text.split() for text in words]
+    offsets = np.zeros(len(token_lists) + 1, dtype=np.int64)
+    np.cumsum([len(tokens) for tokens in token_lists], out=offsets[1:])
+    ids, vocabulary = pd.factorize(np.array(list(chain.from_iterable(token_lists)), dtype=object))
+    return {'vocabulary': np.asarray(vocabulary, dtype=object), 'offsets': offsets, 'ids': ids.astype(np.int32)}
+
+# Fonction pour reconstruire le texte des mots essentiels des lignes demandées (positions)
+def decode_tokens(tokens, positions):
+    vocabulary, offsets, ids = tokens['vocabulary'], tokens['offsets'], tokens['ids']
+    return [" ".join(vocabulary[ids[offsets[position]:offsets[position + 1]]]) for position in positions]
+
+# Fonction pour mesurer la mémoire occupée par les tableaux d'identifiants et le vocabulaire
+def tokens_memory(tokens):
+    return tokens['offsets'].nbytes + tokens['ids'].nbytes + sum(sys.getsizeof(word) for word in tokens['vocabulary'])
+
+# Fonction pour construire l'index inversé mot -> lignes à partir des identifiants de mots ;
+# les lignes contenant le mot d'identifiant i sont rows[offsets[i]:offsets[i + 1]] (triées)
+def build_inverted_index(tokens):
+    ids = tokens['ids']
+    counts = np.diff(tokens['offsets'])
+    rows = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+    offsets = np.zeros(len(tokens['vocabulary']) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ids, minlength=len(tokens['vocabulary'])), out=offsets[1:])
+    return {'rows': rows[np.argsort(ids, kind='stable')], 'offsets': offsets}
+
+# Fonction pour trouver les lignes (positions) contenant tous les mots de la recherche,
+# nettoyée comme les commentaires
+def search_rows(results, query):
+    vocabulary = results['tokens']['vocabulary']
+    index = results['index']
+    positions = None
+    for word in clean_comment(query).split():
+        ids = np.flatnonzero(vocabulary == word)
+        if len(ids) == 0:
+            return np.array([], dtype=np.int32)
+        rows = np.unique(index['rows'][index['offsets'][ids[0]]:index['offsets'][ids[0] + 1]])
+        positions = rows if positions is None else np.intersect1d(positions, rows, assume_unique=True)
+    return positions if positions is not None else np.array([], dtype=np.int32)
+
+# Fonction pour passer les résultats en représentation compacte : Sentiment catégoriel,
+# Score en float32, Opportunité booléen et mots essentiels remplacés par des identifiants entiers.
+# Le rapport 'memory' donne les octets par ligne avant et après.
+def compact_results(results):
+    with stage('compactage', len(results['df'])):
+        df = results['df']
+        rows = max(len(df), 1)
+        before = df.memory_usage(deep=True).sum()
+        tokens = encode_tokens(df['Mots_Essentiels'])
+        compact = df.drop(columns=['Mots_Essentiels'])
+        compact['Sentiment'] = pd.Categorical(compact['Sentiment'], categories=SENTIMENTS)
+        compact['Score'] = compact['Score'].astype(np.float32)
+        compact['Opportunité'] = compact['Opportunité'].astype(bool)
+        after = compact.memory_usage(deep=True).sum() + tokens_memory(tokens)
+        memory = {'avant': float(before / rows), 'après': float(after / rows)}
+        index = build_inverted_index(tokens)
+    return {**results, 'df': compact, 'tokens': tokens, 'index': index, 'memory': memory}
+
+# Fonction pour réanalyser des résultats compacts (par exemple après une modification du lexique) :
+# le DataFrame compact garde toutes les colonnes d'origine, seules les colonnes d'analyse, les compteurs
+# et l'index sont recalculés ; les autres informations (lots d'une série) sont conservées
+def reanalyze_results(results, workers=1):
+    fresh = compact_results(analyze_comments_parallel(results['df'].drop(columns=ANALYSIS_COLUMNS, errors='ignore'), workers))
+    return {**{key: value for key, value in results.items() if key != 'lexique'}, **fresh}
+
+# Fonction pour préparer le DataFrame enrichi à l'écriture Parquet : les colonnes du fichier d'origine
+# qui mélangent plusieurs types (nombres et textes) sont enregistrées en texte
+def parquet_frame(df):
+    mixed = [column for column in df.columns
+             if df[column].dtype == object and column != 'Expressions_Opportunité'
+             and pd.api.types.infer_dtype(df[column], skipna=True).startswith('mixed')]
+    return df.astype({column: str for column in mixed}) if mixed else df
+
+# Fonction pour rajouter la colonne Mots_Essentiels (texte) à quelques lignes d'un résultat compact
+def with_words(results, frame):
+    positions = results['df'].index.get_indexer(frame.index)
+    return frame.assign(Mots_Essentiels=decode_tokens(results['tokens'], positions))
+
+# Fonction pour ajouter les identifiants de mots d'un nouveau lot à ceux d'un résultat existant :
+# le vocabulaire existant garde ses numéros, seuls les mots nouveaux sont ajoutés à la fin.
+# Renvoie aussi, pour chaque mot du lot, son numéro dans le vocabulaire fusionné.
+def append_tokens(base, delta):
+    positions = dict(zip(base['vocabulary'], range(len(base['vocabulary']))))
+    new_words = [word for word in delta['vocabulary'] if word not in positions]
+    positions.update(zip(new_words, range(len(base['vocabulary']), len(base['vocabulary']) + len(new_words))))
+    mapping = np.array([positions[word] for word in delta['vocabulary']], dtype=np.int32)
+    tokens = {
+        'vocabulary': np.concatenate([base['vocabulary'], np.array(new_words, dtype=object)]),
+        'offsets': np.concatenate([base['offsets'], delta['offsets'][1:] + base['offsets'][-1]]),
+        'ids': np.concatenate([base['ids'], mapping[delta['ids']]]),
+    }
+    return tokens, mapping
+
+# Fonction pour ajouter l'index inversé d'un nouveau lot (lignes décalées de `shift`) à un index
+# existant sans tri : chaque liste de lignes existante est recopiée à sa nouvelle place et les
+# lignes du lot sont écrites à sa suite, ce qui garde les listes triées.
+def append_index(base, delta, mapping, vocabulary_size, shift):
+    counts = np.zeros(vocabulary_size, dtype=np.int64)
+    base_counts = np.diff(base['offsets'])
+    delta_counts = np.diff(delta['offsets'])
+    counts[:len(base_counts)] = base_counts
+    counts[mapping] += delta_counts
+    offsets = np.zeros(vocabulary_size + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    rows = np.empty(offsets[-1], dtype=np.int32)
+    moves = offsets[:len(base_counts)] - base['offsets'][:-1]
+    rows[np.repeat(moves, base_counts) + np.arange(len(base['rows']))] = base['rows']
+    starts = offsets[mapping] + np.pad(base_counts, (0, vocabulary_size - len(base_counts)))[mapping] - delta['offsets'][:-1]
+    rows[np.repeat(starts, delta_counts) + np.arange(len(delta['rows']))] = delta['rows'] + shift
+    return {'rows': rows, 'offsets': offsets}
+
+# Mode incrémental : fusion des résultats compacts d'un nouveau lot de commentaires (delta)
+# dans des résultats compacts existants. Seul le lot a été analysé ; compteurs, n-grammes,
+# vocabulaire et index inversé sont fusionnés sans repasser sur le texte de l'historique.
+def append_results(base, delta):
+    with stage('ajout_incremental', delta['rows']):
+        frame = delta['df'].set_axis(delta['df'].index + base['rows'])
+        df = pd.concat([base['df'], frame])
+        df['Sentiment'] = pd.Categorical(df['Sentiment'], categories=SENTIMENTS)
+        tokens, mapping = append_tokens(base['tokens'], delta['tokens'])
+        index = append_index(base['index'], delta['index'], mapping, len(tokens['vocabulary']), len(base['df']))
+        counters = {key: base[key] + Counter() for key in COUNTER_KEYS}
+        for key in COUNTER_KEYS:
+            counters[key].update(delta[key])
+        rows = max(len(df), 1)
+        memory = {name: (base['memory'][name] * len(base['df']) + delta['memory'][name] * len(delta['df'])) / rows
+                  for name in ['avant', 'après']}
+    results = {
+        **base,
+        **counters,
+        'df': df,
+        'rows': base['rows'] + delta['rows'],
+        # Un même commentaire peut revenir d'un lot à l'autre : les distincts sont recomptés sur la série
+        'unique_rows': df['Commentaire'].fillna('').astype(str).nunique(),
+        'tokens': tokens,
+        'index': index,
+        'memory': memory,
+        'ngram_counts': merge_ngram_counts([base['ngram_counts'], delta['ngram_counts']]),
+    }
+    if delta.get('preview'):
+        results['preview'] = True
+    return results
@@ -0,0 +1,81 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+import pandas as pd
+
+from analyse import COUNTER_KEYS, analyze_comments_parallel, analyze_csv_in_chunks, default_workers, parquet_frame
+from ngrammes import NGRAM_NAMES, top_ngrams
+
+
+# Fonction pour enregistrer le DataFrame enrichi au format demandé
+def write_results(df, path, output_format):
+    if output_format == 'parquet':
+        parquet_frame(df).to_parquet(path, index=False)
+    else:
+        df = df.copy()
+        df['Expressions_Opportunité'] = df['Expressions_Opportunité'].str.join('; ')
+        df.to_csv(path, index=False)
+
+
+# Fonction pour enregistrer les compteurs (sentiments, mots, expressions, n-grammes estimés) dans un CSV au format long
+def write_counters(results, path):
+    rows = [(key, item, count) for key in COUNTER_KEYS for item, count in results[key].most_common()]
+    rows += [(NGRAM_NAMES[n].lower(), item, count) for n in results['ngram_counts']
+             for item, count in top_ngrams(results['ngram_counts'], n).most_common()]
+    pd.DataFrame(rows, columns=['Compteur', 'Clé', 'Occurrences']).to_csv(path, index=False)
+
+
+# Fonction pour analyser un fichier CSV et écrire ses résultats dans le dossier de sortie ; l'arborescence
+# des fichiers sous leur dossier commun (base) est reproduite, si bien que exports/2024-01/comments.csv
+# et exports/2024-02/comments.csv ne s'écrasent pas
+def process_file(path, args, base):
+    name = os.path.splitext(os.path.relpath(os.path.abspath(path), base))[0]
+    os.makedirs(os.path.join(args.sortie, os.path.dirname(name)), exist_ok=True)
+    start = time.perf_counter()
+    if args.chunksize:
+        results = analyze_csv_in_chunks(path, chunksize=args.chunksize, workers=args.workers)
+    else:
+        results = analyze_comments_parallel(pd.read_csv(path), args.workers)
+    write_results(results['df'], os.path.join(args.sortie, f"{name}.{args.format}"), args.format)
+    write_counters(results, os.path.join(args.sortie, f"{name}_compteurs.csv"))
+    return results['rows'], time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse en lot de fichiers CSV de commentaires clients, sans interface.")
+    parser.add_argument('fichiers', nargs='+', help="Fichiers CSV ou motifs (ex. exports/*.csv)")
+    parser.add_argument('--sortie', default='resultats', help="Dossier de sortie (défaut : resultats)")
+    parser.add_argument('--format', choices=['parquet', 'csv'], default='parquet')
+    parser.add_argument('--workers', type=int, default=default_workers(), help="Nombre de processus d'analyse")
+    parser.add_argument('--chunksize', type=int, default=0,
+                        help="Lecture par blocs de N lignes (seul un aperçu des lignes est alors écrit)")
+    args = parser.parse_args(argv)
+
+    paths = sorted({os.path.normpath(path) for pattern in args.fichiers for path in (glob.glob(pattern) or [pattern])})
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    os.makedirs(args.sortie, exist_ok=True)
+
+    timings = []
+    failures = 0
+    for path in paths:
+        try:
+            rows, duration = process_file(path, args, base)
+        except Exception as e:
+            print(f"ERREUR {path} : {e}", file=sys.stderr)
+            failures += 1
+            continue
+        timings.append((path, rows, duration))
+        print(f"{path} : {rows} lignes en {duration:.2f} s ({rows / max(duration, 1e-9):,.0f} lignes/s)")
+
+    total_rows = sum(rows for _, rows, _ in timings)
+    total_duration = sum(duration for _, _, duration in timings)
+    print(f"Total : {len(timings)} fichier(s), {total_rows} lignes en {total_duration:.2f} s"
+          f" ({total_rows / max(total_duration, 1e-9):,.0f} lignes/s), {failures} échec(s)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
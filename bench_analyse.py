@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+from analyse import (
+    SENTIMENTS, analyze_comments, clean_comments, count_words_by_sentiment, match_opportunities,
+    negative_words, opportunity_phrases, positive_words, score_comments, sentiment_labels, stop_words,
+)
+from ngrammes import count_ngrams_by_sentiment
+
+# Mots de remplissage courants dans les commentaires, en plus des lexiques de l'analyse
+MOTS_NEUTRES = [
+    'produit', 'livraison', 'service', 'client', 'commande', 'prix', 'qualité',
+    'application', 'site', 'colis', 'vendeur', 'emballage', 'taille', 'couleur',
+]
+PONCTUATION = ['', '', '', '!', '.', '...', ',', ' !']
+
+
+# Fonction pour générer des commentaires français synthétiques à partir du vocabulaire de l'analyse
+def generer_commentaires(n, seed=0):
+    rng = random.Random(seed)
+    outils = sorted(stop_words)
+    positifs = sorted(positive_words)
+    negatifs = sorted(negative_words)
+    comments = []
+    for _ in range(n):
+        words = rng.choices(outils, k=rng.randint(2, 10)) + rng.choices(MOTS_NEUTRES, k=rng.randint(1, 6))
+        tirage = rng.random()
+        if tirage < 0.35:
+            words.append(rng.choice(positifs).capitalize())
+        elif tirage < 0.65:
+            words.append(rng.choice(negatifs))
+        if rng.random() < 0.3:
+            words.append(rng.choice(opportunity_phrases))
+        rng.shuffle(words)
+        comments.append(" ".join(words) + rng.choice(PONCTUATION))
+    return pd.Series(comments)
+
+
+# Étapes mesurées : chacune reçoit le contexte des étapes précédentes et renvoie sa sortie
+def etape_nettoyage(ctx):
+    return clean_comments(ctx['comments'])
+
+
+def etape_sentiment(ctx):
+    return sentiment_labels(score_comments(clean_comments(ctx['comments'], remove_stopwords=False, clauses=True)))
+
+
+def etape_opportunites(ctx):
+    return clean_comments(ctx['comments'], remove_stopwords=False, clauses=True).apply(match_opportunities)
+
+
+def etape_compteurs(ctx):
+    return count_words_by_sentiment(ctx['nettoyage'], ctx['sentiment'])
+
+
+def etape_ngrammes(ctx):
+    return count_ngrams_by_sentiment(ctx['nettoyage'], ctx['sentiment'], SENTIMENTS)
+
+
+def etape_nuage_de_mots(ctx):
+    from wordcloud import WordCloud
+    counts = ctx['compteurs']['positif']
+    wordcloud = WordCloud(width=800, height=400, background_color='white', colormap='viridis')
+    return wordcloud.generate_from_frequencies(dict(counts.most_common(200))).to_image()
+
+
+# Chaîne complète (avec dédoublonnage des commentaires identiques)
+def etape_analyse_complete(ctx):
+    return analyze_comments(pd.DataFrame({'Commentaire': ctx['comments']}))
+
+
+ETAPES = [
+    ('nettoyage', etape_nettoyage),
+    ('sentiment', etape_sentiment),
+    ('opportunites', etape_opportunites),
+    ('compteurs', etape_compteurs),
+    ('ngrammes', etape_ngrammes),
+    ('nuage_de_mots', etape_nuage_de_mots),
+    ('analyse_complete', etape_analyse_complete),
+]
+
+
+# Fonction pour mesurer une étape : durée (sans tracemalloc), puis pic mémoire (second passage tracé)
+def mesurer(fonction, ctx, memoire=True):
+    debut = time.perf_counter()
+    sortie = fonction(ctx)
+    duree = time.perf_counter() - debut
+    pic = None
+    if memoire:
+        tracemalloc.start()
+        fonction(ctx)
+        pic = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return sortie, duree, pic
+
+
+def lancer(tailles, etapes, memoire=True):
+    resultats = []
+    for taille in tailles:
+        ctx = {'comments': generer_commentaires(taille)}
+        for nom, fonction in ETAPES:
+            if nom not in etapes:
+                continue
+            try:
+                ctx[nom], duree, pic = mesurer(fonction, ctx, memoire)
+            except ImportError as e:
+                print(f"{nom:>16} | {taille:>9} lignes | ignorée ({e})")
+                continue
+            resultats.append({
+                'etape': nom,
+                'lignes': taille,
+                'secondes': duree,
+                'lignes_par_seconde': taille / max(duree, 1e-9),
+                'pic_memoire_octets': pic,
+            })
+            pic_mo = f"{pic / 2**20:8.1f} Mo" if pic is not None else "       -"
+            print(f"{nom:>16} | {taille:>9} lignes | {duree:8.3f} s | {taille / max(duree, 1e-9):>12,.0f} lignes/s | {pic_mo}")
+    return resultats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesure des étapes de l'analyse des commentaires sur des données synthétiques.")
+    parser.add_argument('--tailles', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--etapes', nargs='+', choices=[nom for nom, _ in ETAPES], default=[nom for nom, _ in ETAPES])
+    parser.add_argument('--sans-memoire', action='store_true', help="Ne pas mesurer le pic mémoire (exécution deux fois plus rapide)")
+    parser.add_argument('--sortie', default='bench_resultats', help="Dossier où enregistrer le JSON des résultats")
+    args = parser.parse_args(argv)
+
+    resultats = lancer(args.tailles, args.etapes, memoire=not args.sans_memoire)
+    rapport = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'coeurs': os.cpu_count(),
+        'resultats': resultats,
+    }
+    os.makedirs(args.sortie, exist_ok=True)
+    chemin = os.path.join(args.sortie, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(chemin, 'w', encoding='utf-8') as f:
+        json.dump(rapport, f, ensure_ascii=False, indent=2)
+    print(f"Résultats enregistrés dans {chemin}")
+
+
+if __name__ == '__main__':
+    main()
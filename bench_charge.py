@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import requests
+import websockets
+from streamlit.proto.Alert_pb2 import Alert
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+from bench_analyse import generer_commentaires
+
+DOSSIER = os.path.dirname(os.path.abspath(__file__))
+
+# Libellé du sélecteur de fichier de l'Accueil
+SELECTEUR_FICHIER = "Choisissez un fichier CSV"
+
+# Parcours d'une session après l'envoi de son fichier : chaque étape sélectionne une valeur
+# dans une liste déroulante de la barre latérale et provoque un rafraîchissement du script
+PARCOURS = [
+    ("Navigation", "Résultats"),
+    ("infos traitées", "Données Brutes"),
+    ("infos traitées", "Analyse des Sentiments"),
+    ("options", "Diagramme des sentiments"),
+    ("options", "Commentaires"),
+    ("Classification des commentaires et occurences", "Bon commentaires"),
+    ("Classification des commentaires et occurences", "Mauvais commentaires"),
+    ("Classification des commentaires et occurences", "Occurrences des Mots"),
+    ("infos traitées", "Opportunités d'Amélioration"),
+    ("infos traitées", "Tendances"),
+]
+
+
+# Fonction pour écrire le CSV envoyé par une session (commentaires synthétiques datés)
+def generer_csv(chemin, lignes, seed):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, lignes), unit='D')
+    pd.DataFrame({'Commentaire': generer_commentaires(lignes, seed), 'Date': dates.strftime('%Y-%m-%d')}).to_csv(chemin, index=False)
+
+
+# Fonction pour trouver un port TCP libre pour le serveur de test
+def port_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# Fonction pour lire la mémoire résidente du serveur et de ses processus fils (processus d'analyse)
+def rss_serveur(pid):
+    total, restants = 0, [pid]
+    while restants:
+        pid = restants.pop()
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+            for tache in os.listdir(f'/proc/{pid}/task'):
+                with open(f'/proc/{pid}/task/{tache}/children') as f:
+                    restants.extend(int(fils) for fils in f.read().split())
+        except (OSError, ValueError):
+            pass
+    return total
+
+
+# Fonction pour suivre le pic de mémoire résidente du serveur jusqu'à l'arrêt demandé
+def suivre_pic(pid, pic, fin):
+    while not fin.wait(0.05):
+        pic[0] = max(pic[0], rss_serveur(pid))
+
+
+# Fonction pour démarrer le serveur Streamlit de l'application (stockage des analyses isolé,
+# les sessions partent à froid) et attendre qu'il réponde
+def demarrer_serveur(port, timeout):
+    env = dict(os.environ, ANALYSE_STORE_DIR=tempfile.mkdtemp(prefix='bench_charge_'))
+    serveur = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', os.path.join(DOSSIER, 'site3.py'), '--server.headless=true',
+         f'--server.port={port}', '--server.address=127.0.0.1', '--server.fileWatcherType=none',
+         '--browser.gatherUsageStats=false', '--server.maxUploadSize=4096'],
+        cwd=DOSSIER, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if serveur.poll() is not None:
+            raise RuntimeError(f"Le serveur Streamlit s'est arrêté (code {serveur.returncode})")
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/_stcore/health', timeout=1).ok:
+                return serveur
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    serveur.kill()
+    raise RuntimeError("Le serveur Streamlit n'a pas démarré à temps")
+
+
+# Session simulée comme un navigateur sans interface : le client parle le protocole du serveur
+# Streamlit (messages protobuf sur la websocket /_stcore/stream), envoie son fichier par la route
+# de téléversement et garde l'état des widgets d'un rafraîchissement à l'autre
+class SessionNavigateur:
+    def __init__(self, hote, timeout):
+        self.hote = hote
+        self.timeout = timeout
+        self.session_id = None
+        self.widgets = {}
+        self.etats = {}
+        self.fragments = {}
+        self.requetes = itertools.count()
+
+    async def ouvrir(self):
+        self.ws = await websockets.connect(f'ws://{self.hote}/_stcore/stream', subprotocols=['streamlit'], max_size=None)
+
+    async def fermer(self):
+        await self.ws.close()
+
+    async def recevoir(self):
+        message = ForwardMsg()
+        message.ParseFromString(await asyncio.wait_for(self.ws.recv(), self.timeout))
+        return message
+
+    # Rafraîchissement du script (ou d'un fragment) avec l'état courant des widgets ; les relances
+    # demandées par le script (st.rerun) sont suivies jusqu'à la fin réelle. Renvoie la durée.
+    async def executer(self, fragment_id='', auto=False):
+        message = BackMsg()
+        message.rerun_script.widget_states.widgets.extend(self.etats.values())
+        message.rerun_script.fragment_id = fragment_id
+        message.rerun_script.is_auto_rerun = auto
+        debut = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+        affiches = set()
+        while True:
+            message = await self.recevoir()
+            genre = message.WhichOneof('type')
+            if genre == 'new_session':
+                # Nouvelle exécution complète : les fragments à rafraîchir sont redéclarés par le script
+                self.session_id = message.new_session.initialize.session_id
+                self.fragments.clear()
+            elif genre == 'delta' and message.delta.WhichOneof('type') == 'new_element':
+                element = message.delta.new_element
+                contenu = getattr(element, element.WhichOneof('type'))
+                if element.WhichOneof('type') == 'exception':
+                    raise RuntimeError(f"{contenu.type} : {contenu.message}")
+                if element.WhichOneof('type') == 'alert' and contenu.format == Alert.ERROR:
+                    raise RuntimeError(contenu.body)
+                if getattr(contenu, 'id', '') and hasattr(contenu, 'label'):
+                    self.widgets[contenu.label] = contenu
+                    affiches.add(contenu.id)
+            elif genre == 'auto_rerun':
+                self.fragments[message.auto_rerun.fragment_id] = message.auto_rerun.interval
+            elif genre == 'stop_auto_rerun':
+                for fragment in message.stop_auto_rerun.fragment_ids:
+                    self.fragments.pop(fragment, None)
+            elif genre == 'script_finished':
+                if message.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("Erreur de compilation du script")
+                if message.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY:
+                    # Comme le navigateur, l'état des widgets qui ne sont plus affichés est oublié
+                    self.etats = {id_: etat for id_, etat in self.etats.items() if id_ in affiches}
+                    break
+                if message.script_finished == ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY:
+                    break
+        return time.perf_counter() - debut
+
+    # Sélection d'une valeur dans une liste déroulante, suivie du rafraîchissement
+    async def choisir(self, libelle, valeur):
+        widget = self.widgets.get(libelle)
+        if widget is None:
+            raise RuntimeError(f"Liste « {libelle} » absente de la page")
+        self.etats[widget.id] = WidgetState(id=widget.id, string_value=valeur)
+        return await self.executer()
+
+    # Envoi d'un fichier comme le navigateur : adresse de téléversement demandée au serveur,
+    # envoi du contenu par HTTP, puis rafraîchissement avec le fichier dans le sélecteur
+    async def envoyer_fichier(self, chemin):
+        widget = self.widgets[SELECTEUR_FICHIER]
+        debut = time.perf_counter()
+        message = BackMsg()
+        message.file_urls_request.request_id = str(next(self.requetes))
+        message.file_urls_request.file_names.append(os.path.basename(chemin))
+        message.file_urls_request.session_id = self.session_id
+        await self.ws.send(message.SerializeToString())
+        while True:
+            reponse = await self.recevoir()
+            if reponse.WhichOneof('type') == 'file_urls_response' and reponse.file_urls_response.response_id == message.file_urls_request.request_id:
+                break
+        if reponse.file_urls_response.error_msg:
+            raise RuntimeError(reponse.file_urls_response.error_msg)
+        adresses = reponse.file_urls_response.file_urls[0]
+        await asyncio.to_thread(self.televerser, adresses.upload_url, chemin)
+        etat = WidgetState(id=widget.id)
+        fichier = etat.file_uploader_state_value.uploaded_file_info.add()
+        fichier.name = os.path.basename(chemin)
+        fichier.size = os.path.getsize(chemin)
+        fichier.file_id = adresses.file_id
+        fichier.file_urls.CopyFrom(adresses)
+        self.etats[widget.id] = etat
+        await self.executer()
+        return time.perf_counter() - debut
+
+    # Envoi du contenu du fichier à la route de téléversement du serveur (requête PUT multipart)
+    def televerser(self, adresse, chemin):
+        with requests.Session() as http:
+            # Jeton anti-CSRF : cookie posé par la route de santé du serveur, renvoyé en en-tête
+            http.get(f'http://{self.hote}/_stcore/health', timeout=self.timeout)
+            jeton = http.cookies.get('_streamlit_xsrf', '')
+            with open(chemin, 'rb') as f:
+                reponse = http.put(f'http://{self.hote}{adresse}', files={'file': (os.path.basename(chemin), f, 'text/csv')},
+                                   headers={'X-Xsrftoken': jeton}, timeout=self.timeout)
+            reponse.raise_for_status()
+
+    # Attente de la fin de l'analyse en arrière-plan : les fragments à rafraîchissement automatique
+    # (progression de l'analyse) sont relancés à leur intervalle, comme le ferait le navigateur
+    async def attendre_analyse(self):
+        debut = time.perf_counter()
+        while self.fragments:
+            await asyncio.sleep(min(self.fragments.values()))
+            for fragment in list(self.fragments):
+                if fragment in self.fragments:
+                    await self.executer(fragment, auto=True)
+        return time.perf_counter() - debut
+
+
+# Fonction pour ouvrir une session : connexion et première exécution de la page d'accueil
+async def ouvrir_session(hote, timeout):
+    session = SessionNavigateur(hote, timeout)
+    await session.ouvrir()
+    await session.executer()
+    return session
+
+
+# Fonction pour charger les modules de l'application dans le serveur avec une session aussitôt fermée
+async def prechauffer(hote, timeout):
+    session = await ouvrir_session(hote, timeout)
+    await session.fermer()
+
+
+# Fonction pour simuler une session ouverte : envoi du fichier, puis parcours des sous-pages
+# des Résultats. Renvoie la durée de chaque rafraîchissement complet.
+async def simuler_session(session, chemin, tours):
+    durees = [await session.envoyer_fichier(chemin)]
+    # Première ouverture des Résultats : inclut la fin de l'analyse du fichier (ou sa relecture depuis le stockage)
+    premiers_resultats = await session.choisir(*PARCOURS[0])
+    premiers_resultats += await session.attendre_analyse()
+    durees.append(premiers_resultats)
+    for numero in range(tours):
+        for libelle, valeur in PARCOURS[1 if numero == 0 else 0:]:
+            durees.append(await session.choisir(libelle, valeur))
+    return {'durees': durees, 'premiers_resultats': premiers_resultats}
+
+
+# Fonction pour faire tourner les sessions en même temps sur le serveur : toutes sont ouvertes
+# avant que la première n'envoie son fichier
+async def lancer_sessions(hote, fichiers, sessions, tours, timeout):
+    ouvertes = await asyncio.gather(*(ouvrir_session(hote, timeout) for _ in range(sessions)))
+    try:
+        return await asyncio.gather(*(simuler_session(session, fichiers[numero % len(fichiers)], tours)
+                                      for numero, session in enumerate(ouvertes)))
+    finally:
+        for session in ouvertes:
+            await session.fermer()
+
+
+def lancer(sessions, lignes, tours, identiques, timeout):
+    dossier = tempfile.mkdtemp(prefix='bench_charge_csv_')
+    fichiers = []
+    for numero in range(1 if identiques else sessions):
+        chemin = os.path.join(dossier, f"session_{numero}.csv")
+        generer_csv(chemin, lignes, seed=numero)
+        fichiers.append(chemin)
+    port = port_libre()
+    serveur = demarrer_serveur(port, timeout)
+    try:
+        hote = f'127.0.0.1:{port}'
+        # Une première page vide charge les modules de l'application : la mémoire de départ est
+        # celle du serveur prêt, sans aucune session ni résultat en mémoire
+        asyncio.run(prechauffer(hote, timeout))
+        rss_depart = rss_serveur(serveur.pid)
+        pic = [rss_depart]
+        fin = threading.Event()
+        surveillance = threading.Thread(target=suivre_pic, args=(serveur.pid, pic, fin), daemon=True)
+        surveillance.start()
+        debut = time.perf_counter()
+        try:
+            mesures = asyncio.run(lancer_sessions(hote, fichiers, sessions, tours, timeout))
+        finally:
+            total = time.perf_counter() - debut
+            fin.set()
+            surveillance.join()
+        rss_fin = rss_serveur(serveur.pid)
+    finally:
+        serveur.terminate()
+        serveur.wait()
+    toutes = np.concatenate([mesure['durees'] for mesure in mesures])
+    return {
+        'sessions': sessions,
+        'lignes_par_fichier': lignes,
+        'fichiers_identiques': identiques,
+        'rafraichissements': int(len(toutes)),
+        'secondes': total,
+        # Durées vues par le client : rafraîchissement complet, transfert des messages compris
+        'latence_p50_ms': float(np.percentile(toutes, 50) * 1000),
+        'latence_p95_ms': float(np.percentile(toutes, 95) * 1000),
+        'latence_max_ms': float(toutes.max() * 1000),
+        'premiers_resultats_p95_ms': float(np.percentile([mesure['premiers_resultats'] for mesure in mesures], 95) * 1000),
+        # Mémoire résidente du serveur (processus d'analyse compris) : au repos, au pic des sessions,
+        # et surcoût moyen d'une session (pic moins repos, divisé par le nombre de sessions,
+        # les résultats partagés entre sessions n'étant comptés qu'une fois)
+        'rss_serveur_depart_mo': rss_depart / 2**20,
+        'rss_serveur_pic_mo': pic[0] / 2**20,
+        'rss_serveur_fin_mo': rss_fin / 2**20,
+        'rss_par_session_mo': (pic[0] - rss_depart) / sessions / 2**20,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge : N sessions simultanées d'un même serveur Streamlit envoient un CSV et parcourent les Résultats.")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 5, 10], help="Nombres de sessions simultanées à tester")
+    parser.add_argument('--lignes', type=int, default=20000, help="Lignes du CSV envoyé par chaque session")
+    parser.add_argument('--tours', type=int, default=1, help="Nombre de parcours des sous-pages par session")
+    parser.add_argument('--identiques', action='store_true', help="Toutes les sessions envoient le même fichier")
+    parser.add_argument('--timeout', type=float, default=600, help="Délai maximal d'un rafraîchissement (secondes)")
+    parser.add_argument('--sortie', default='bench_resultats', help="Dossier où enregistrer le JSON des résultats")
+    args = parser.parse_args(argv)
+
+    resultats = []
+    for sessions in args.sessions:
+        resultat = lancer(sessions, args.lignes, args.tours, args.identiques, args.timeout)
+        resultats.append(resultat)
+        print(f"{sessions:>4} sessions | {resultat['rafraichissements']:>5} rafraîchissements | "
+              f"p50 {resultat['latence_p50_ms']:8.0f} ms | p95 {resultat['latence_p95_ms']:8.0f} ms | "
+              f"RSS serveur {resultat['rss_serveur_depart_mo']:6.0f} -> {resultat['rss_serveur_pic_mo']:6.0f} Mo "
+              f"({resultat['rss_par_session_mo']:5.1f} Mo par session)")
+    rapport = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'coeurs': os.cpu_count(),
+        'resultats': resultats,
+    }
+    os.makedirs(args.sortie, exist_ok=True)
+    chemin = os.path.join(args.sortie, f"charge_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(chemin, 'w', encoding='utf-8') as f:
+        json.dump(rapport, f, ensure_ascii=False, indent=2)
+    print(f"Résultats enregistrés dans {chemin}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules dont on mesure le temps d'import à froid, chacun dans un processus neuf
+MODULES = ['pandas', 'streamlit', 'matplotlib.pyplot', 'wordcloud', 'analyse', 'stockage', 'mesures']
+
+# Bibliothèques de visualisation qui ne doivent plus être chargées pour afficher l'Accueil
+MODULES_LOURDS = ['matplotlib.pyplot', 'wordcloud']
+
+DOSSIER = os.path.dirname(os.path.abspath(__file__))
+
+# Premier affichage de l'Accueil (script Streamlit exécuté sans navigateur) ; les imports
+# préalables simulent l'ancien en-tête de site3.py qui chargeait matplotlib et wordcloud
+SCRIPT_PREMIER_AFFICHAGE = """
+import json, sys, time
+debut = time.perf_counter()
+for module in {imports!r}:
+    __import__(module)
+from streamlit.testing.v1 import AppTest
+AppTest.from_file({script!r}, default_timeout=120).run()
+print(json.dumps({{
+    'secondes': time.perf_counter() - debut,
+    'modules_lourds_charges': [m for m in {lourds!r} if m in sys.modules],
+}}))
+"""
+
+
+def executer(code):
+    sortie = subprocess.run([sys.executable, '-c', code], cwd=DOSSIER, capture_output=True, text=True, check=True)
+    return json.loads(sortie.stdout.strip().splitlines()[-1])
+
+
+# Fonction pour mesurer le temps d'import à froid d'un module
+def temps_import(module):
+    code = f"import json, time\ndebut = time.perf_counter()\nimport {module}\nprint(json.dumps(time.perf_counter() - debut))"
+    return executer(code)
+
+
+# Fonction pour mesurer le premier affichage de l'Accueil, avec ou sans import anticipé des modules lourds
+def premier_affichage(imports_anticipes):
+    code = SCRIPT_PREMIER_AFFICHAGE.format(
+        imports=imports_anticipes, script=os.path.join(DOSSIER, 'site3.py'), lourds=MODULES_LOURDS)
+    return executer(code)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rapport des temps d'import et du premier affichage de l'application.")
+    parser.add_argument('--repetitions', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print("Temps d'import à froid (meilleur de", args.repetitions, "essais) :")
+    for module in MODULES:
+        meilleur = min(temps_import(module) for _ in range(args.repetitions))
+        print(f"  {module:<20} {meilleur * 1000:8.0f} ms")
+
+    print("Premier affichage de l'Accueil :")
+    for nom, imports in [('avant (imports en tête)', MODULES_LOURDS), ('après (imports différés)', [])]:
+        mesures = [premier_affichage(imports) for _ in range(args.repetitions)]
+        meilleure = min(mesures, key=lambda mesure: mesure['secondes'])
+        print(f"  {nom:<26} {meilleure['secondes'] * 1000:8.0f} ms, modules lourds chargés : "
+              f"{', '.join(meilleure['modules_lourds_charges']) or 'aucun'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+import argparse
+import time
+
+from analyse import clean_comment, clean_comments
+from bench_analyse import generer_commentaires
+
+
+def mesurer(fonction, comments):
+    debut = time.perf_counter()
+    resultat = fonction(comments)
+    duree = time.perf_counter() - debut
+    return resultat, duree
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare clean_comment (ligne par ligne) et clean_comments (en bloc).")
+    parser.add_argument('--lignes', type=int, default=200000)
+    args = parser.parse_args()
+
+    comments = generer_commentaires(args.lignes)
+    avant, duree_avant = mesurer(lambda s: s.astype(str).apply(clean_comment), comments)
+    apres, duree_apres = mesurer(clean_comments, comments)
+    assert avant.tolist() == apres.tolist(), "clean_comments diverge de clean_comment"
+
+    print(f"Lignes             : {args.lignes}")
+    print(f"clean_comment      : {args.lignes / duree_avant:,.0f} lignes/s ({duree_avant:.2f} s)")
+    print(f"clean_comments     : {args.lignes / duree_apres:,.0f} lignes/s ({duree_apres:.2f} s)")
+    print(f"Accélération       : x{duree_avant / duree_apres:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+# Journal des étapes : une ligne JSON par étape mesurée
+logger = logging.getLogger('analyse.mesures')
+
+# Liste des mesures de l'exécution en cours (propre à chaque session/fil Streamlit)
+_records = contextvars.ContextVar('mesures', default=None)
+
+
+# Fonction pour lire la mémoire résidente actuelle du processus (octets)
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Hors Linux : pic de mémoire résidente (Ko sous Linux, octets sous macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# Fonction pour envoyer les lignes JSON du journal sur la sortie d'erreur (une seule fois)
+def enable_json_log(stream=None):
+    if not any(getattr(handler, 'mesures', False) for handler in logger.handlers):
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler.mesures = True
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+# Fonction pour démarrer une nouvelle collecte de mesures et renvoyer la liste qui les recevra
+def start_collecting():
+    records = []
+    _records.set(records)
+    return records
+
+
+# Mesure d'une étape : durée, lignes traitées et variation de mémoire résidente.
+# Le dictionnaire produit permet de renseigner le nombre de lignes en cours d'étape.
+@contextmanager
+def stage(name, rows=None):
+    record = {'etape': name, 'lignes': rows}
+    rss = current_rss()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['secondes'] = time.perf_counter() - start
+        record['memoire_delta_octets'] = current_rss() - rss
+        record['horodatage'] = time.time()
+        records = _records.get()
+        if records is not None:
+            records.append(record)
+        logger.info(json.dumps(record, ensure_ascii=False))
+
+
+# Démarrage d'un profilage cProfile (pour une exécution complète du script)
+def start_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+# Arrêt du profilage : texte des fonctions les plus coûteuses (temps cumulé)
+def stop_profile(profiler, limit=30):
+    profiler.disable()
+    buffer = io.StringIO()
+    pstats.Stats(profiler, stream=buffer).sort_stats('cumulative').print_stats(limit)
+    return buffer.getvalue()
@@ -0,0 +1,166 @@
+import heapq
+import os
+from itertools import chain
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+# Plafond mémoire de l'ensemble des compteurs de n-grammes (configurable) et estimation
+# de la place occupée par une entrée suivie (chaîne du n-gramme, compteur et erreur)
+NGRAM_MAX_BYTES = int(float(os.environ.get('ANALYSE_NGRAMMES_MAX_MB', '32')) * 2**20)
+NGRAM_ENTRY_BYTES = 400
+
+# Tailles de n-grammes suivies et nombre de commentaires comptés exactement avant d'être
+# versés dans les compteurs bornés
+NGRAM_SIZES = [2, 3]
+NGRAM_NAMES = {2: 'Bigrammes', 3: 'Trigrammes'}
+NGRAM_BLOCK_ROWS = 50000
+
+
+# Compteur borné des n-grammes les plus fréquents (algorithme Space-Saving, éviction par lots) :
+# au plus `capacity` entrées sont conservées. Une entrée évincée puis revue repart du plancher
+# (le plus grand compte évincé), si bien que chaque compte est une borne haute du vrai
+# nombre d'occurrences et que l'écart est au plus l'erreur mémorisée pour l'entrée.
+class SpaceSaving:
+    def __init__(self, capacity):
+        self.capacity = max(int(capacity), 1)
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+
+    # Ajout de comptes exacts (par exemple un Counter calculé sur un bloc de commentaires)
+    def update(self, counts):
+        tracked = self.counts
+        for item, count in counts.items():
+            if item in tracked:
+                tracked[item] += count
+            else:
+                tracked[item] = self.floor + count
+                self.errors[item] = self.floor
+        self._prune()
+
+    # Fusion de deux compteurs bornés (blocs d'un fichier en flux, tranches d'une analyse en arrière-plan)
+    def merge(self, other):
+        items = dict.fromkeys(chain(self.counts, other.counts))
+        counts = {item: self.counts.get(item, self.floor) + other.counts.get(item, other.floor) for item in items}
+        self.errors = {item: self.errors.get(item, self.floor) + other.errors.get(item, other.floor) for item in items}
+        self.counts = counts
+        self.floor += other.floor
+        self._prune()
+        return self
+
+    def _prune(self):
+        if len(self.counts) <= self.capacity:
+            return
+        # Les `capacity` plus grands comptes sont gardés ; le suivant est le plus grand compte évincé
+        ranked = heapq.nlargest(self.capacity + 1, self.counts.items(), key=itemgetter(1))
+        self.floor = max(self.floor, ranked[-1][1])
+        self.counts = dict(ranked[:-1])
+        self.errors = {item: self.errors[item] for item in self.counts}
+
+    # Les n-grammes les plus fréquents, comme Counter.most_common
+    def most_common(self, n=None):
+        items = sorted(self.counts.items(), key=itemgetter(1), reverse=True)
+        return items if n is None else items[:n]
+
+    def __len__(self):
+        return len(self.counts)
+
+    # Représentation sérialisable (stockage JSON) et reconstruction
+    def to_dict(self):
+        return {'capacity': self.capacity, 'floor': self.floor,
+                'items': [[item, count, self.errors[item]] for item, count in self.counts.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['capacity'])
+        sketch.floor = data['floor']
+        sketch.counts = {item: count for item, count, _ in data['items']}
+        sketch.errors = {item: error for item, _, error in data['items']}
+        return sketch
+
+
+# Fonction pour calculer la capacité de chaque compteur à partir du plafond mémoire global
+def ngram_capacity(structures, max_bytes=None):
+    max_bytes = NGRAM_MAX_BYTES if max_bytes is None else max_bytes
+    return max(max_bytes // (NGRAM_ENTRY_BYTES * max(structures, 1)), 1)
+
+
+# Fonction pour créer les compteurs vides : un par taille de n-gramme et par sentiment
+def empty_ngram_counts(sentiments, max_bytes=None):
+    capacity = ngram_capacity(len(NGRAM_SIZES) * len(sentiments), max_bytes)
+    return {n: {sentiment: SpaceSaving(capacity) for sentiment in sentiments} for n in NGRAM_SIZES}
+
+
+# Fonction pour extraire les n-grammes (mots consécutifs) d'un commentaire nettoyé
+def ngrams(text, n):
+    words = text.split()
+    return map(" ".join, zip(*(words[i:] for i in range(n))))
+
+
+# Comptage exact et pondéré des n-grammes d'un bloc de commentaires : les mots de tout le bloc
+# sont mis bout à bout (séparés par un marqueur \x00) et numérotés, chaque n-gramme devient
+# un entier (numéro du (n-1)-gramme * taille du vocabulaire + numéro du dernier mot) et les
+# n-grammes qui chevauchent un marqueur sont écartés. Seuls les n-grammes distincts sont
+# ensuite reconstitués en texte.
+def _count_block(texts, weights):
+    words = " \x00 ".join(texts).split()
+    ids, vocabulary = pd.factorize(np.asarray(words, dtype=object))
+    ids = ids.astype(np.int64)
+    is_marker = np.array([word == '\x00' for word in vocabulary], dtype=bool)[ids]
+    token_weights = np.asarray(weights, dtype=np.int64)[np.cumsum(is_marker)]
+    counts = {}
+    codes, labels, valid = ids, vocabulary, ~is_marker
+    for n in range(2, max(NGRAM_SIZES) + 1):
+        valid = valid[:-1] & ~is_marker[n - 1:]
+        codes = codes[:-1] * len(vocabulary) + ids[n - 1:]
+        # Renumérotation des n-grammes présents pour que les codes restent petits
+        grams, codes = np.unique(np.where(valid, codes, -1), return_inverse=True)
+        codes = codes.reshape(-1)
+        labels = np.array([f"{labels[gram // len(vocabulary)]} {vocabulary[gram % len(vocabulary)]}" if gram >= 0 else ''
+                           for gram in grams], dtype=object)
+        if n in NGRAM_SIZES:
+            totals = np.bincount(codes[valid], weights=token_weights[n - 1:][valid], minlength=len(grams))
+            kept = np.flatnonzero(totals)
+            counts[n] = dict(zip(labels[kept].tolist(), totals[kept].astype(np.int64).tolist()))
+    return counts
+
+
+# Fonction pour compter les n-grammes de chaque sentiment par blocs : chaque bloc est compté
+# exactement puis versé dans les compteurs bornés, la mémoire reste donc limitée par la taille
+# des blocs et la capacité des compteurs. categories liste les sentiments possibles et
+# weights donne la multiplicité de chaque commentaire.
+def count_ngrams_by_sentiment(words, sentiments, categories, weights=None, max_bytes=None):
+    sentiments = pd.Series(np.asarray(sentiments, dtype=object), index=words.index)
+    weights = pd.Series(1 if weights is None else np.asarray(weights), index=words.index)
+    results = empty_ngram_counts(categories, max_bytes)
+    for start in range(0, len(words), NGRAM_BLOCK_ROWS):
+        block = words.iloc[start:start + NGRAM_BLOCK_ROWS]
+        for sentiment, group in block.groupby(sentiments.iloc[start:start + NGRAM_BLOCK_ROWS], sort=False):
+            for n, counts in _count_block(group.tolist(), weights.loc[group.index].to_numpy()).items():
+                results[n][sentiment].update(counts)
+    return results
+
+
+# Fonction pour fusionner des compteurs de n-grammes (None est ignoré)
+def merge_ngram_counts(parts):
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return None
+    merged = {n: {sentiment: SpaceSaving(sketch.capacity).merge(sketch) for sentiment, sketch in sketches.items()}
+              for n, sketches in parts[0].items()}
+    for part in parts[1:]:
+        for n, sketches in part.items():
+            for sentiment, sketch in sketches.items():
+                merged[n].setdefault(sentiment, SpaceSaving(sketch.capacity)).merge(sketch)
+    return merged
+
+
+# Fonction pour obtenir les n-grammes les plus fréquents d'une taille donnée, pour certains sentiments
+def top_ngrams(ngram_counts, n, sentiments=None):
+    sketches = [sketch for sentiment, sketch in ngram_counts[n].items() if sentiments is None or sentiment in sentiments]
+    merged = SpaceSaving(max([sketch.capacity for sketch in sketches], default=1))
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
@@ -0,0 +1,174 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from analyse import COUNTER_KEYS, tokens_memory
+from ngrammes import NGRAM_ENTRY_BYTES
+from taches import EN_COURS, TERMINEE, cancel_job, start_job
+
+# Budget mémoire global des résultats partagés entre les sessions (configurable) et estimation
+# de la place occupée par une entrée d'un compteur de mots
+SHARED_MAX_BYTES = int(float(os.environ.get('ANALYSE_PARTAGE_MAX_MB', '1024')) * 2**20)
+COUNTER_ENTRY_BYTES = 120
+
+
+# Fonction pour estimer la mémoire occupée par des résultats compacts
+def results_size(results):
+    size = int(results['df'].memory_usage(deep=True).sum()) + tokens_memory(results['tokens'])
+    size += sum(array.nbytes for array in results['index'].values())
+    size += sum(len(results[name]) for name in COUNTER_KEYS) * COUNTER_ENTRY_BYTES
+    size += sum(len(sketch) for sketches in results['ngram_counts'].values() for sketch in sketches.values()) * NGRAM_ENTRY_BYTES
+    return size
+
+
+# Fonction pour passer les tableaux d'identifiants et l'index en lecture seule : les résultats sont
+# partagés entre les sessions. Le DataFrame, lui, reste modifiable (la copie à l'écriture de pandas
+# n'est pas active par défaut avant pandas 3) : les pages ne doivent que le lire, tout filtrage
+# ou tri en produit un nouveau.
+def freeze_results(results):
+    for array in (results['tokens']['offsets'], results['tokens']['ids'], *results['index'].values()):
+        if isinstance(array, np.ndarray):
+            array.flags.writeable = False
+    return results
+
+
+# Résultats partagés par toutes les sessions du serveur, indexés par la clé de l'analyse
+# (empreinte du fichier envoyé) : un seul DataFrame enrichi, un seul jeu de compteurs et
+# d'images de nuages de mots par fichier, une seule analyse en arrière-plan à la fois.
+# Chaque entrée compte les sessions qui l'utilisent ; quand le budget mémoire est dépassé,
+# les entrées qui ne sont plus utilisées partent en premier (la moins récemment utilisée d'abord),
+# puis les images des entrées encore utilisées, qui peuvent être redessinées.
+class SharedResults:
+    def __init__(self, max_bytes=None):
+        self.max_bytes = SHARED_MAX_BYTES if max_bytes is None else max_bytes
+        self.entries = OrderedDict()
+        self.sessions = {}
+        self.lock = threading.RLock()
+
+    def _entry(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = {'results': None, 'bytes': 0, 'job': None, 'holders': set(),
+                                         'images': {}, 'images_bytes': 0, 'lock': threading.Lock()}
+        self.entries.move_to_end(key)
+        return entry
+
+    # Rattachement d'une session à une clé (la session lâche la clé qu'elle utilisait avant)
+    def hold(self, session, key):
+        with self.lock:
+            if self.sessions.get(session) != key:
+                self.release(session)
+                self.sessions[session] = key
+            entry = self._entry(key)
+            entry['holders'].add(session)
+            return entry
+
+    # Une session n'utilise plus ses résultats ; l'analyse en cours que plus personne n'attend est annulée
+    def release(self, session):
+        with self.lock:
+            key = self.sessions.pop(session, None)
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            entry['holders'].discard(session)
+            if not entry['holders'] and entry['job'] is not None and entry['job']['status'] == EN_COURS:
+                cancel_job(entry['job'])
+                entry['job'] = None
+            if not entry['holders'] and entry['results'] is None:
+                del self.entries[key]
+
+    # Sessions fermées (is_active renvoie False) : leurs entrées peuvent être évincées
+    def prune(self, is_active):
+        with self.lock:
+            for session in [session for session in self.sessions if not is_active(session)]:
+                self.release(session)
+
+    # Résultats d'une clé pour une session ; s'ils manquent, build() les calcule (ou les recharge)
+    # une seule fois : les autres sessions qui demandent la même clé attendent ce calcul.
+    # build() peut renvoyer None, rien n'est alors partagé.
+    def get(self, session, key, build=None):
+        entry = self.hold(session, key)
+        if entry['results'] is not None or build is None:
+            return entry['results']
+        with entry['lock']:
+            if entry['results'] is None:
+                results = build()
+                if results is not None:
+                    return self.put(key, results)
+            return entry['results']
+
+    # Partage de résultats calculés par une session : si la clé en a déjà, ce sont eux qui sont renvoyés
+    def put(self, key, results):
+        with self.lock:
+            entry = self._entry(key)
+            if entry['results'] is None:
+                entry['results'] = freeze_results(results)
+                entry['bytes'] = results_size(results)
+                if entry['job'] is not None and entry['job']['status'] == TERMINEE:
+                    entry['job'] = None
+                self._evict()
+            return entry['results']
+
+    # Remplacement des résultats d'une clé (série complétée par un nouveau lot) : les sessions qui
+    # gardent l'ancienne version la conservent, les images de l'ancienne version sont oubliées
+    def replace(self, key, results):
+        with self.lock:
+            entry = self._entry(key)
+            entry['results'] = freeze_results(results)
+            entry['bytes'] = results_size(results)
+            entry['images'], entry['images_bytes'] = {}, 0
+            self._evict()
+            return entry['results']
+
+    # Analyse en arrière-plan d'une clé, commune aux sessions qui ont envoyé le même fichier ;
+    # df n'est nécessaire que si aucune analyse n'est en cours (sinon None suffit)
+    def job(self, session, key, df=None, workers=1, restart=False):
+        with self.lock:
+            entry = self.hold(session, key)
+            job = entry['job']
+            if df is not None and (job is None or (restart and job['status'] not in (EN_COURS, TERMINEE))):
+                job = entry['job'] = start_job(df, key, workers)
+            return job
+
+    # Image (PNG) d'un nuage de mots d'une entrée, dessinée par render() à la première demande
+    def image(self, key, name, render):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and name in entry['images']:
+                return entry['images'][name]
+        png = render()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and name not in entry['images']:
+                entry['images'][name] = png
+                entry['images_bytes'] += len(png)
+                self._evict()
+        return png
+
+    def total_bytes(self):
+        return sum(entry['bytes'] + entry['images_bytes'] for entry in self.entries.values())
+
+    def _evict(self):
+        total = self.total_bytes()
+        for key in [key for key, entry in self.entries.items() if not entry['holders']]:
+            if total <= self.max_bytes:
+                return
+            entry = self.entries.pop(key)
+            total -= entry['bytes'] + entry['images_bytes']
+        for entry in self.entries.values():
+            if total <= self.max_bytes:
+                return
+            total -= entry['images_bytes']
+            entry['images'], entry['images_bytes'] = {}, 0
+
+    # État du cache pour le panneau de diagnostic
+    def stats(self):
+        with self.lock:
+            return {
+                'entrees': len(self.entries),
+                'sessions': len(self.sessions),
+                'octets': self.total_bytes(),
+                'budget_octets': self.max_bytes,
+            }
@@ -1,20 +1,35 @@
 import streamlit as st
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
-import re
-from collections import Counter
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
+import hashlib
+import io
+import time
+from analyse import LEXICON_FINGERPRINT, SENTIMENTS, analyze_comments_parallel, analyze_csv_in_chunks, append_results, compact_results, default_workers, reanalyze_results, search_rows, with_words
+from mesures import enable_json_log, stage, start_collecting, start_profile, stop_profile
+from ngrammes import NGRAM_NAMES, top_ngrams
+from partage import SharedResults
+from stockage import entry_exists, load_results, load_series_history, save_results, series_key, series_lock
+from taches import EN_COURS, TERMINEE, cancel_job, job_partial, job_progress
+from tendances import PERIODS, build_rollups, date_columns, rollup_range
 
 # Configuration du mode clair - doit être la première commande Streamlit
 st.set_page_config(page_title="Analyse des Commentaires Clients", page_icon="🔍", layout="centered", initial_sidebar_state="auto")
 
-# Importer Font Awesome pour les icônes
-st.markdown('<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.4/css/all.min.css">', unsafe_allow_html=True)
+# Mesures des étapes de ce rafraîchissement (journal JSON sur la sortie d'erreur et panneau de diagnostic)
+enable_json_log()
+stage_records = start_collecting()
+diagnostics = st.sidebar.checkbox("Diagnostics", key='diagnostics')
+profiler = start_profile() if diagnostics and st.sidebar.checkbox("Profiler cette exécution (cProfile)", key='profilage') else None
 
-# CSS pour personnaliser l'apparence en mode clair
+try:
+    # Importer Font Awesome pour les icônes
+    st.markdown('<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.4/css/all.min.css">', unsafe_allow_html=True)
 
+    # CSS pour personnaliser l'apparence en mode clair
 
-st.markdown("""
+
+    st.markdown("""
     <style>
     body {
         background-color: white;
@@ -29,7 +44,7 @@ st.markdown("""
         font-family: 'Arial', sans-serif;
         text-shadow: 2px 2px 4px rgba(0,0,0,0.2);
     }
-    
+
     .upload-area {
         border: 2px dashed #4CAF50;
         padding: 20px;
@@ -68,247 +83,490 @@ st.markdown("""
         </style>
 """, unsafe_allow_html=True)
 
-# Titre de l'application
-st.markdown('<div class="title"><i class="fas fa-chart-line"></i> Analyse des Commentaires Clients by AK GUERINDA </div>', unsafe_allow_html=True)
-st.markdown('<div class="description"><i class="fas fa-info-circle"></i> Téléchargez un fichier CSV contenant les commentaires des clients pour une analyse approfondie.</div>', unsafe_allow_html=True)
-
-# Liste de stopwords personnalisés (y compris les articles et pronoms)
-stop_words = set([
-    'le', 'la', 'les', 'un', 'une', 'des', 'de', 'du', 'dans', 'en', 'et', 'à', 
-    'au', 'aux', 'ce', 'cet', 'cette', 'cela', 'ça', 'sur', 'pour', 'par', 
-    'avec', 'sans', 'sous', 'qui', 'que', 'quoi', 'dont', 'où', 'est', 'sont',
-    'être', 'avoir', 'faire', 'comme', 'plus', 'moins', 'très', 'bien', 'mal',
-    'je', 'tu', 'il', 'elle', 'nous', 'vous', 'ils', 'elles', 'me', 'te', 'se', 
-    'moi', 'toi', 'lui', 'leur', 'eux'
-])
-
-# Fonction pour nettoyer le texte
-def clean_comment(comment):
-    comment = re.sub(r'[^\w\s]', '', comment.lower())  # Mise en minuscule et suppression des caractères spéciaux
-    words = comment.split()
-    cleaned_words = [word for word in words if word not in stop_words]  # Suppression des stopwords
-    return " ".join(cleaned_words)
-# Fonction pour analyser les sentiments
-def analyze_sentiment(comment):
-    positive_words = set([
-        'excellent', 'jadore', 'super', 'expérience', 'superbe', 'génial', 
-        'incroyable', 'fantastique', 'parfait', 'formidable', 'exceptionnel', 
-        'positif', 'agréable', 'satisfait', 'recommandé', 'adore', 'adoré', 'like'
-    ])
-    negative_words = set([
-        'mauvais', 'cher', 'horrible', 'déçu', 'médiocre', 'nul', 'problème', 
-        'lent', 'déplorable', 'insatisfait', 'terrible', 'frustrant', 'inacceptable'
-    ])
-    comment_words = set(comment.split())
-    if comment_words & positive_words:
-        return 'positif'
-    elif comment_words & negative_words:
-        return 'négatif'
-    else:
-        return 'neutre'
-
-# Fonction pour détecter les opportunités d'amélioration
-def detect_opportunities(comment):
-    opportunity_phrases = [
-        'ajouter', 'il manque', 'améliorer', 'optimiser', 'perfectionner', 
-        'corriger', 'compléter', 'renforcer', 'adapter', 'modifier', 
-        'développer', 'mettre à jour', 'plus rapide', 'plus fluide', 
-        'réduire les bugs', 'stabiliser', 'augmenter l\'efficacité', 
-        'améliorer la vitesse', 'diminuer la latence', 'rendre plus durable', 
-        'meilleure finition', 'plus solide', 'haute qualité', 'résoudre les défauts', 
-        'plus fiable', 'inclure', 'intégrer', 'proposer davantage de choix', 
-        'ajouter une fonctionnalité', 'enrichir le contenu', 'ajouter des détails', 
-        'plus d\'options', 'personnaliser', 'simplifier', 'rendre plus intuitif', 
-        'faciliter', 'plus ergonomique', 'améliorer l\'accessibilité', 
-        'réduire la complexité', 'clarifier', 'améliorer l\'esthétique', 
-        'moderniser', 'mettre en valeur', 'plus attrayant', 'revoir le design', 
-        'ajouter des couleurs', 'rendre plus clair', 'réduire le coût', 
-        'proposer des promotions', 'améliorer le rapport qualité-prix', 
-        'plus compétitif', 'rendre plus abordable', 'rapide', 'lent'
-    ]
-    for phrase in opportunity_phrases:
-        if phrase in comment:
-            return True
-    return False
-
-# Section d'importation du fichier avec un style personnalisé
-st.markdown('<div class="upload-area"><i class="fas fa-upload"></i>', unsafe_allow_html=True)
-uploaded_file = st.file_uploader("Choisissez un fichier CSV", type="csv")
-st.markdown('</div>', unsafe_allow_html=True)
-
-
-
-# Définir les pages principales et sous-pages
-page = st.sidebar.selectbox("Navigation", ["Accueil", "Résultats"])
-
-if page == "Accueil":
-    st.sidebar.markdown('<i class="fas fa-home icon-home"></i>', unsafe_allow_html=True)
-    if uploaded_file is not None:
-        try:
-            df = pd.read_csv(uploaded_file)
-            st.markdown('<div class="success"><i class="fas fa-check-circle"></i> Fichier chargé avec succès.</div>', unsafe_allow_html=True)
-            # Enregistrer les données dans une session pour les partager entre les pages
-            st.session_state['df'] = df
-        except Exception as e:
-            st.error(f"Erreur lors du chargement du fichier : {e}")
-            st.stop()
-
-elif page == "Résultats":
-    df = st.session_state['df']
-    st.sidebar.markdown('<i class="fas fa-chart-bar icon-results"></i>', unsafe_allow_html=True)
-    # Nettoyer les commentaires et extraire les mots essentiels
-    df['Mots_Essentiels'] = df['Commentaire'].astype(str).apply(clean_comment)
-    df['Sentiment'] = df['Mots_Essentiels'].apply(analyze_sentiment)
-    # Séparer les commentaires en bons et mauvais
-    good_comments = df[df['Sentiment'] == 'positif']
-    bad_comments = df[df['Sentiment'] == 'négatif']
-    # Extraction et comptage des mots-clés pour les bons commentaires
-    good_words = " ".join(good_comments['Mots_Essentiels']).split()
-    good_word_counts = Counter(good_words)
-    # Extraction et comptage des mots-clés pour les mauvais commentaires
-    bad_words = " ".join(bad_comments['Mots_Essentiels']).split()
-    bad_word_counts = Counter(bad_words)
-    # Détecter les opportunités d'amélioration
-    df['Opportunité'] = df['Mots_Essentiels'].apply(detect_opportunities)
-    opportunities = df[df['Opportunité']]
-    # Sous-pages pour "Résultats"
-    subpage = st.sidebar.selectbox("infos traitées",["Données Brutes", "Analyse des Sentiments", "Opportunités d'Amélioration"])
-
-    if 'df' in st.session_state:
-        df = st.session_state['df']
-        
-        
-        if subpage == "Données Brutes":
-            st.markdown('<div class="result-area">', unsafe_allow_html=True)
-            st.markdown('<div class="header"><i class="fas fa-database"></i> Données Brutes: les commentaires</div>', unsafe_allow_html=True)
-            st.write(df.head())
-        
-        elif subpage == "Analyse des Sentiments":
-            st.sidebar.markdown('<i class="fas fa-smile icon-sentiment"></i>', unsafe_allow_html=True) 
-            st.markdown(
-                """
+    # Titre de l'application
+    st.markdown('<div class="title"><i class="fas fa-chart-line"></i> Analyse des Commentaires Clients by AK GUERINDA </div>', unsafe_allow_html=True)
+    st.markdown('<div class="description"><i class="fas fa-info-circle"></i> Téléchargez un fichier CSV contenant les commentaires des clients pour une analyse approfondie.</div>', unsafe_allow_html=True)
+
+    # Résultats partagés par toutes les sessions du serveur : les sessions qui envoient le même fichier
+    # utilisent le même DataFrame enrichi, les mêmes compteurs et les mêmes images de nuages de mots
+    @st.cache_resource(show_spinner=False)
+    def shared_results():
+        return SharedResults()
+
+    # Identifiant de la session courante et test des sessions encore ouvertes (pour libérer leurs résultats)
+    def session_id():
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx is not None else 'local'
+
+    def session_is_active(session):
+        return not runtime.exists() or runtime.get_instance().is_active_session(session)
+
+    # Analyse complète d'un fichier (relue depuis le disque si une session l'a déjà faite), calculée une seule fois
+    # pour toutes les sessions et indexée par l'empreinte (hash) de son contenu
+    def analyze_file(file_hash, df, workers):
+        def build():
+            results = load_results(file_hash)
+            if results is None:
+                with st.spinner("Analyse des commentaires en cours..."):
+                    results = compact_results(analyze_comments_parallel(df, workers))
+                # Enregistrement sur disque pour les autres sessions et après un redémarrage
+                save_results(file_hash, results)
+            return results
+        return shared_results().get(session_id(), file_hash, build)
+
+    # Ajout d'un lot à une série (mode incrémental) : seul le lot est analysé, et seulement s'il ne fait pas
+    # encore partie de la série ; la fusion se fait sous le verrou de la série, relue juste avant, pour
+    # qu'un lot ajouté en même temps par une autre session ne soit pas perdu
+    def update_series(series, file_hash, uploaded_file, workers):
+        key = series_key(series)
+        results = load_results(key, any_lexicon=True)
+        delta = None
+        if results is None or file_hash not in results['lots']:
+            with stage('lecture_csv') as record:
+                delta_df = pd.read_csv(uploaded_file)
+                record['lignes'] = len(delta_df)
+            with st.spinner("Analyse du nouveau lot..."):
+                delta = compact_results(analyze_comments_parallel(delta_df, workers))
+        with series_lock(key):
+            results = load_results(key, any_lexicon=True)
+            changed = False
+            if results is None and entry_exists(key):
+                # Série enregistrée dans une autre version du format : son historique est réanalysé ;
+                # une série illisible n'est jamais remplacée par le seul nouveau lot
+                history = load_series_history(key)
+                if history is None:
+                    raise ValueError(f"la série « {series} » existe mais n'a pas pu être relue, le lot n'a pas été ajouté")
+                with st.spinner("Format de stockage modifié : réanalyse de la série..."):
+                    results = reanalyze_results(history, workers)
+                changed = True
+            elif results is not None and results['lexique'] != LEXICON_FINGERPRINT:
+                # Le lexique a changé depuis l'enregistrement de la série : tout son historique est réanalysé
+                with st.spinner("Lexique modifié : réanalyse de la série..."):
+                    results = reanalyze_results(results, workers)
+                changed = True
+            added = delta is not None and (results is None or file_hash not in results['lots'])
+            if added:
+                lots = [] if results is None else results['lots']
+                results = delta if results is None else append_results(results, delta)
+                results['lots'] = lots + [file_hash]
+                changed = True
+            if changed and not save_results(key, results):
+                st.warning(f"La série « {series} » n'a pas pu être enregistrée : ce lot devra être ajouté de nouveau.")
+            # La copie partagée de la série est remplacée sous le verrou, dans l'ordre des ajouts
+            shared = shared_results()
+            shared.hold(session_id(), key)
+            results = shared.replace(key, results)
+        if added:
+            st.info(f"{delta['rows']} nouveaux commentaires ajoutés à la série « {series} » ({results['rows']} au total).")
+        else:
+            st.info(f"Ce fichier fait déjà partie de la série « {series} » ({results['rows']} commentaires au total).")
+        return results
+
+    # Bibliothèque du nuage de mots importée seulement à la première page qui l'affiche,
+    # puis partagée par toutes les sessions du serveur
+    @st.cache_resource(show_spinner=False)
+    def load_wordcloud():
+        from wordcloud import WordCloud
+        return WordCloud
+
+    # Nombre maximal de mots envoyés au nuage de mots, pour borner le temps de mise en page
+    WORDCLOUD_TOP_K = 200
+
+    # Rendu d'un nuage de mots en PNG
+    def render_wordcloud(frequencies, width=800, height=400, background_color='white', colormap='viridis'):
+        wordcloud = load_wordcloud()(width=width, height=height, background_color=background_color, colormap=colormap)
+        wordcloud.generate_from_frequencies(dict(frequencies))
+        buffer = io.BytesIO()
+        wordcloud.to_image().save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    # Affichage du nuage de mots à partir des K mots les plus fréquents ; l'image est conservée avec les
+    # résultats partagés et resservie à toutes les sessions qui affichent les mêmes mots
+    def show_wordcloud(word_counts):
+        top_words = tuple(word_counts.most_common(WORDCLOUD_TOP_K))
+        if not top_words:
+            st.info("Aucun mot à afficher.")
+            return
+        with stage('nuage_de_mots', len(top_words)):
+            st.image(shared_results().image(st.session_state.get('results_key'), top_words, lambda: render_wordcloud(top_words)))
+
+    # Agrégats par période d'une analyse, calculés une seule fois par fichier, colonne et période
+    # (rows distingue les résultats partiels d'une analyse en cours des résultats finaux)
+    @st.cache_data(max_entries=16, show_spinner="Calcul des tendances...")
+    def trend_rollups(results_key, rows, date_column, period, _results):
+        with stage('tendances', rows):
+            return build_rollups(_results, date_column, period)
+
+    # Couleurs fixes de chaque sentiment dans les graphiques
+    SENTIMENT_COLORS = {'positif': '#4CAF50', 'négatif': '#FF5722', 'neutre': '#9E9E9E'}
+
+    # Graphiques dessinés par le navigateur (Vega-Lite) : seules les quelques valeurs agrégées
+    # sont envoyées, aucune figure n'est construite ni conservée sur le serveur
+    def sentiment_pie_chart(sentiment_counts):
+        data = pd.DataFrame(sentiment_counts.most_common(), columns=['Sentiment', 'Commentaires'])
+        data['Part'] = data['Commentaires'] / max(data['Commentaires'].sum(), 1)
+        encoding = {
+            'theta': {'field': 'Commentaires', 'type': 'quantitative', 'stack': True},
+            'color': {'field': 'Sentiment', 'type': 'nominal', 'legend': {'title': 'Sentiments'},
+                      'scale': {'domain': list(SENTIMENT_COLORS), 'range': list(SENTIMENT_COLORS.values())}},
+            'tooltip': [{'field': 'Sentiment', 'type': 'nominal'}, {'field': 'Commentaires', 'type': 'quantitative'},
+                        {'field': 'Part', 'type': 'quantitative', 'format': '.1%'}],
+        }
+        st.vega_lite_chart(data, {
+            'title': 'Répartition des Sentiments',
+            'encoding': encoding,
+            'layer': [
+                {'mark': {'type': 'arc', 'outerRadius': 140, 'stroke': 'white'}},
+                {'mark': {'type': 'text', 'radius': 165}, 'encoding': {'text': {'field': 'Part', 'type': 'quantitative', 'format': '.1%'}}},
+            ],
+        }, width='stretch')
+
+    def top_bar_chart(items, label, value='Occurrences'):
+        st.bar_chart(pd.DataFrame(items, columns=[label, value]), x=label, y=value, sort=f"-{value}")
+
+    # Choix des éléments du nuage de mots : les mots seuls ou les n-grammes estimés d'un sentiment
+    def cloud_counts(results, word_counts, sentiment, key):
+        choice = st.radio("Nuage de", ["Mots"] + list(NGRAM_NAMES.values()), horizontal=True, key=key)
+        if choice == "Mots":
+            return word_counts
+        n = next(n for n, name in NGRAM_NAMES.items() if name == choice)
+        return top_ngrams(results['ngram_counts'], n, [sentiment])
+
+    # Tableau paginé : le tri et le découpage se font côté serveur et seule la page visible
+    # (avec ses mots essentiels reconstruits) est envoyée au navigateur
+    def paginated_table(results, frame, columns, key, page_size=50, sort_column=None, ascending=True):
+        sortable = [column for column in columns if column in frame.columns and column != 'Expressions_Opportunité']
+        options = ["(aucun)"] + sortable
+        col_sort, col_order, col_size = st.columns(3)
+        sort_column = col_sort.selectbox("Trier par", options, index=options.index(sort_column) if sort_column in options else 0, key=f"{key}_tri")
+        ascending = col_order.selectbox("Ordre", ["Croissant", "Décroissant"], index=0 if ascending else 1, key=f"{key}_ordre") == "Croissant"
+        sizes = sorted({25, 50, 100, 500, page_size})
+        page_size = col_size.selectbox("Lignes par page", sizes, index=sizes.index(page_size), key=f"{key}_taille")
+        pages = max(1, -(-len(frame) // page_size))
+        # La page mémorisée peut dépasser le nombre de pages si le tableau a rétréci
+        st.session_state[f"{key}_page"] = min(st.session_state.get(f"{key}_page", 1), pages)
+        page = st.number_input(f"Page (sur {pages})", min_value=1, max_value=pages, key=f"{key}_page")
+        if sort_column != "(aucun)":
+            frame = frame.sort_values(sort_column, ascending=ascending, kind='stable')
+        start = (page - 1) * page_size
+        visible = frame.iloc[start:start + page_size]
+        st.write(with_words(results, visible)[columns])
+        st.caption(f"Lignes {min(start + 1, len(frame))} à {start + len(visible)} sur {len(frame)}.")
+
+    # Suivi d'une analyse en arrière-plan, rafraîchi chaque seconde sans relancer toute la page ;
+    # la page entière n'est relancée que lorsqu'une nouvelle tranche est prête ou que l'analyse s'arrête
+    @st.fragment(run_every=1)
+    def job_progress_panel(job, shown):
+        st.progress(job_progress(job), text=f"Analyse en arrière-plan : {job['rows_done']} / {job['rows']} commentaires "
+                                            f"({time.time() - job['started']:.0f} s)")
+        if st.button("Annuler l'analyse", key='annuler_analyse'):
+            cancel_job(job)
+        if (job['status'], job['parts']) != shown:
+            st.rerun()
+
+    # Affichage de l'état d'une analyse en arrière-plan (progression, annulation ou reprise)
+    def job_panel(job):
+        if job['status'] == EN_COURS:
+            job_progress_panel(job, (job['status'], job['parts']))
+        elif job['status'] != TERMINEE:
+            if job['error'] is not None:
+                st.error(f"Erreur lors de l'analyse : {job['error']}")
+            else:
+                st.warning(f"Analyse annulée après {job['rows_done']} commentaires sur {job['rows']}.")
+            if st.button("Relancer l'analyse", key='relancer_analyse'):
+                st.session_state['job'] = shared_results().job(session_id(), job['key'], st.session_state['df'], workers, restart=True)
+                st.rerun()
+
+    # Section d'importation du fichier avec un style personnalisé
+    st.markdown('<div class="upload-area"><i class="fas fa-upload"></i>', unsafe_allow_html=True)
+    uploaded_file = st.file_uploader("Choisissez un fichier CSV", type="csv")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+
+    # Définir les pages principales et sous-pages
+    page = st.sidebar.selectbox("Navigation", ["Accueil", "Résultats"])
+    # Nombre de processus utilisés pour l'analyse (les petits fichiers restent analysés en série)
+    workers = st.sidebar.number_input("Processus d'analyse", min_value=1, max_value=default_workers(), value=default_workers())
+
+    # Les résultats des sessions fermées ne sont plus retenus dans le cache partagé
+    shared_results().prune(session_is_active)
+
+    # Analyse en arrière-plan du fichier courant : ses résultats remplacent l'aperçu dès qu'elle est terminée
+    job = st.session_state.get('job')
+    if job is not None and job['key'] != st.session_state.get('results_key'):
+        job = None
+    if job is not None and job['status'] == TERMINEE and st.session_state.get('results') is None:
+        st.session_state['results'] = shared_results().put(job['key'], job['results'])
+        # Le DataFrame d'origine n'est plus retenu par la session, seul le DataFrame enrichi partagé reste
+        st.session_state['df'] = st.session_state['results']['df']
+        st.session_state.pop('job')
+        job = None
+
+    if page == "Accueil":
+        st.sidebar.markdown('<i class="fas fa-home icon-home"></i>', unsafe_allow_html=True)
+        if uploaded_file is not None:
+            # Mode flux : lecture par blocs de la seule colonne Commentaire pour les fichiers volumineux
+            streaming = st.checkbox("Mode flux pour les gros fichiers (lecture par blocs)")
+            if streaming:
+                chunksize = st.number_input("Taille des blocs (lignes)", min_value=1000, value=100000, step=10000)
+            # Mode incrémental : le fichier est un lot de nouveaux commentaires ajouté à une série déjà analysée
+            incremental = not streaming and st.checkbox("Ajouter ce fichier à une série existante (mode incrémental)")
+            if incremental:
+                series = st.text_input("Nom de la série", value="commentaires")
+            try:
+                # L'empreinte n'est calculée qu'une fois par fichier envoyé, pas à chaque rafraîchissement
+                if st.session_state.get('upload_id') != uploaded_file.file_id:
+                    st.session_state['upload_hash'] = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+                    st.session_state['upload_id'] = uploaded_file.file_id
+                file_hash = st.session_state['upload_hash']
+                # Clé de l'analyse : l'empreinte du fichier (et la taille des blocs en mode flux, dont dépend l'aperçu),
+                # ou la série elle-même en mode incrémental : une seule copie de la série est partagée en mémoire
+                if streaming:
+                    results_key = f"{file_hash}-flux-{chunksize}"
+                elif incremental:
+                    results_key = series_key(series)
+                else:
+                    results_key = file_hash
+                # Chaque lot envoyé met à jour la série, même si la session l'affiche déjà
+                upload_key = f"{results_key}+{file_hash}" if incremental else results_key
+                if st.session_state.get('upload_key') != upload_key:
+                    # Résultats déjà en mémoire pour une autre session, sinon rechargés depuis le disque
+                    # s'ils y ont été enregistrés par n'importe quelle session ; une série est toujours relue
+                    # depuis le disque (sous son verrou), pour tenir compte des lots ajoutés par les autres sessions
+                    shared = shared_results()
+                    if incremental:
+                        results = update_series(series, file_hash, uploaded_file, workers)
+                    else:
+                        results = shared.get(session_id(), results_key)
+                        if results is None and shared.job(session_id(), results_key) is None:
+                            results = load_results(results_key)
+                    if results is None and streaming:
+                        progress = st.progress(0.0, text="Analyse par blocs en cours...")
+                        def on_chunk(rows):
+                            progress.progress(min(uploaded_file.tell() / max(uploaded_file.size, 1), 1.0), text=f"{rows} commentaires analysés")
+                        uploaded_file.seek(0)
+                        results = compact_results(analyze_csv_in_chunks(uploaded_file, chunksize=chunksize, on_chunk=on_chunk, workers=workers))
+                        progress.progress(1.0, text=f"{results['rows']} commentaires analysés")
+                        save_results(results_key, results)
+                    # L'analyse en cours d'un fichier précédent a été lâchée (et annulée si plus aucune session ne l'attend)
+                    st.session_state.pop('job', None)
+                    job = None
+                    if results is None:
+                        # L'analyse déjà lancée par une autre session pour ce fichier est suivie telle quelle
+                        job = shared.job(session_id(), results_key)
+                        if job is None:
+                            # Enregistrer les données dans une session pour les partager entre les pages
+                            with stage('lecture_csv') as record:
+                                df = pd.read_csv(uploaded_file)
+                                record['lignes'] = len(df)
+                            # L'analyse démarre aussitôt en arrière-plan, sans attendre l'ouverture des Résultats
+                            job = shared.job(session_id(), results_key, df, workers)
+                        st.session_state['job'] = job
+                        st.session_state['df'] = job['df']
+                    else:
+                        if not incremental:
+                            results = shared.put(results_key, results)
+                        st.session_state['df'] = results['df']
+                    st.session_state['results'] = results
+                    st.session_state['results_key'] = results_key
+                    st.session_state['upload_key'] = upload_key
+                st.session_state['file_hash'] = file_hash
+                st.markdown('<div class="success"><i class="fas fa-check-circle"></i> Fichier chargé avec succès.</div>', unsafe_allow_html=True)
+                if job is not None:
+                    job_panel(job)
+            except Exception as e:
+                st.error(f"Erreur lors du chargement du fichier : {e}")
+                st.stop()
+
+    elif page == "Résultats":
+        st.sidebar.markdown('<i class="fas fa-chart-bar icon-results"></i>', unsafe_allow_html=True)
+        # Résultats rechargés depuis le stockage, issus du mode flux ou de l'analyse en arrière-plan,
+        # sinon analyse mise en cache
+        results = st.session_state.get('results')
+        if results is None and job is not None:
+            job_panel(job)
+            # Résultats partiels : seules les tranches déjà analysées sont affichées
+            results = job_partial(job)
+            if results is None:
+                st.stop()
+            st.info(f"Résultats partiels : {results['rows']} commentaires analysés sur {job['rows']}.")
+        elif results is None:
+            results = st.session_state['results'] = analyze_file(st.session_state['file_hash'], st.session_state['df'], workers)
+            st.session_state['df'] = results['df']
+            st.session_state['results_key'] = st.session_state['file_hash']
+        if results.get('preview'):
+            # Mode flux : les compteurs couvrent tout le fichier, les tableaux n'en montrent qu'un aperçu
+            st.info(f"Mode flux : {results['rows']} commentaires analysés, les tableaux n'affichent qu'un aperçu.")
+        # Taux de dédoublonnage : chaque commentaire distinct n'a été analysé qu'une fois
+        # En mode flux, le nombre de commentaires distincts du fichier est estimé (à 1 % près environ)
+        approx, analysed = ("environ ", "") if results.get('preview') else ("", " analysés")
+        st.caption(f"{approx}{results['unique_rows']} commentaires distincts{analysed} pour {results['rows']} lignes "
+                   f"({approx}{1 - results['unique_rows'] / max(results['rows'], 1):.1%} de doublons).")
+        df = results['df']
+        good_word_counts = results['good_word_counts']
+        bad_word_counts = results['bad_word_counts']
+        word_counts = results['word_counts']
+        phrase_counts = results['phrase_counts']
+        # Séparer les commentaires en bons et mauvais
+        good_comments = df[df['Sentiment'] == 'positif']
+        bad_comments = df[df['Sentiment'] == 'négatif']
+        opportunities = df[df['Opportunité']]
+        # Sous-pages pour "Résultats"
+        subpage = st.sidebar.selectbox("infos traitées",["Données Brutes", "Analyse des Sentiments", "Opportunités d'Amélioration", "Tendances"])
+
+        if 'df' in st.session_state:
+            if subpage == "Données Brutes":
+                st.markdown('<div class="result-area">', unsafe_allow_html=True)
+                st.markdown('<div class="header"><i class="fas fa-database"></i> Données Brutes: les commentaires</div>', unsafe_allow_html=True)
+                st.write(with_words(results, df.head()))
+                memory = results['memory']
+                st.caption(f"Mémoire des résultats : {memory['avant']:.0f} octets par ligne avant compactage, {memory['après']:.0f} après.")
+
+            elif subpage == "Analyse des Sentiments":
+                st.sidebar.markdown('<i class="fas fa-smile icon-sentiment"></i>', unsafe_allow_html=True) 
+                st.markdown(
+                    """
                 <div style="display: flex; align-items: center;">
                 <img src="https://cdn-icons-png.flaticon.com/512/742/742751.png" alt="Sentiment Analysis Icon" style="width:40px; height:40px; margin-right:10px;">
                 <h3 style="margin: 0;">Analyse de Sentiments</h3>
                 </div>
                 """,
-                unsafe_allow_html=True
-            )
-
-            subpage = st.sidebar.selectbox("options",["Diagramme des sentiments", "Commentaires"])
-            if 'df' in st.session_state:
-                df = st.session_state['df']
-                
-                if subpage=="Diagramme des sentiments":
-                    # Répartition des sentiments avec des couleurs plus nuancées et des légendes
-                    st.subheader('Répartition des Sentiments')
-                    sentiment_counts = df['Sentiment'].value_counts()
-                    fig, ax = plt.subplots(figsize=(10, 7))
-                    colors = ['#4CAF50', '#FF5722', '#9E9E9E']  # Couleurs nuancées : Vert pour positif, Rouge pour négatif, Gris pour neutre
-                    sentiment_counts.plot(kind='pie', ax=ax, colors=colors, autopct='%1.1f%%', startangle=90, wedgeprops=dict(edgecolor='w'))
-                    ax.set_ylabel('')
-                    ax.set_title('Répartition des Sentiments')
-                    plt.legend(labels=sentiment_counts.index, loc='upper left', bbox_to_anchor=(1, 0.5), title="Sentiments")
-                    st.pyplot(fig)
-                    #     
-                elif subpage=="Commentaires": 
-                    
-                    
-                    
-                    subpage = st.sidebar.selectbox("Classification des commentaires et occurences",["Bon commentaires", "Mauvais commentaires","Occurrences des Mots"])
-                    if 'df' in st.session_state:
-                        df = st.session_state['df']
-                        
-                        if subpage=="Bon commentaires":
-                            # Afficher les bons  commentaires 
-                            st.subheader('Tableau des Commentaires Positifs')
-                            st.write(good_comments[['Commentaire', 'Sentiment', 'Mots_Essentiels']])
-
-                            # Visualisation du nuage de mots pour les bons commentaires
-                            st.subheader('Nuage de Mots - Commentaires Positifs')
-                            good_wordcloud = WordCloud(width=800, height=400, background_color='white', colormap='viridis').generate_from_frequencies(good_word_counts)
-                            fig, ax = plt.subplots(figsize=(10, 5))
-                            ax.imshow(good_wordcloud, interpolation='bilinear')
-                            ax.axis('off')
-                            st.pyplot(fig)
-                            
-                        elif subpage=="Mauvais commentaires":
-                                
-
-                            # Afficher les mauvais commentaires
-                            st.subheader('Tableau des Commentaires Négatifs')
-                            st.write(bad_comments[['Commentaire', 'Sentiment', 'Mots_Essentiels']])
-
-                            # Visualisation du nuage de mots pour les mauvais commentaires
-                            st.subheader('Nuage de Mots - Commentaires Négatifs')
-                            bad_wordcloud = WordCloud(width=800, height=400, background_color='white', colormap='viridis').generate_from_frequencies(bad_word_counts)
-                            fig, ax = plt.subplots(figsize=(10, 5))
-                            ax.imshow(bad_wordcloud, interpolation='bilinear')
-                            ax.axis('off')
-                            st.pyplot(fig)
-                            
-                        elif subpage == "Occurrences des Mots":
-                            st.markdown('<h2><i class="fas fa-word icon"></i> Occurrences des Mots</h2>', unsafe_allow_html=True)
-                            all_words = " ".join(df['Mots_Essentiels'])
-                            word_counts = Counter(all_words.split())
-                            st.write(pd.DataFrame(word_counts.most_common(10), columns=['Mot', 'Occurrences']))
-                            fig, ax = plt.subplots()
-                            plt.bar(*zip(*word_counts.most_common(10)))
-                            st.pyplot(fig)    
-            
-
-        elif subpage == "Opportunités d'Amélioration":
-            # Ajout d'une icône et d'un style pour la sous-page "Opportunités d'Amélioration"
-            st.sidebar.markdown('<i class="fas fa-lightbulb icon-opportunities"></i>', unsafe_allow_html=True)
-            
-            # Filtrer les opportunités avec un sentiment positif
-            positive_opportunities = df[(df['Opportunité'] == True) & (df['Sentiment'] == 'positif')]
-            
-            # Filtrer les opportunités avec un sentiment négatif ou neutre
-            negative_neutral_opportunities = df[(df['Opportunité'] == True) & 
-                                                ((df['Sentiment'] == 'négatif') | (df['Sentiment'] == 'neutre'))]
-            
-            # Titre pour la section des opportunités d'amélioration
-            st.markdown('<div class="header">Suggestions ou améliorations</div>', unsafe_allow_html=True)
-            
-            # Affichage des opportunités avec un sentiment négatif ou neutre
-            st.write("**Suggestions issues des commentaires négatifs ou neutres :**")
-            st.write(negative_neutral_opportunities[['Commentaire', 'Sentiment', 'Mots_Essentiels']])
-
-            # (Optionnel) Affichage des opportunités avec un sentiment positif
-            st.write("**Opportunités identifiées parmi les commentaires positifs :**")
-            st.write(positive_opportunities[['Commentaire', 'Sentiment', 'Mots_Essentiels']])
-    
-            # Opportunités positives
-            positive_opportunities = df[(df['Opportunité'] == True) & (df['Sentiment'] == 'positif')]
-    
-            # Opportunités négatives ou neutres
-            negative_neutral_opportunities = df[(df['Opportunité'] == True) & 
-                                        ((df['Sentiment'] == 'négatif') | (df['Sentiment'] == 'neutre'))]
-    
-            st.markdown('<div class="header">Suggestions ou améliorations</div>', unsafe_allow_html=True)
-            st.write(negative_neutral_opportunities[['Commentaire', 'Sentiment', 'Mots_Essentiels']])
-
-            
-
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
-            
+                    unsafe_allow_html=True
+                )
+
+                subpage = st.sidebar.selectbox("options",["Diagramme des sentiments", "Commentaires"])
+                if 'df' in st.session_state:
+                    if subpage=="Diagramme des sentiments":
+                        # Répartition des sentiments avec des couleurs plus nuancées et des légendes
+                        st.subheader('Répartition des Sentiments')
+                        with stage('graphique_sentiments'):
+                            sentiment_pie_chart(results['sentiment_counts'])
+                        #     
+                    elif subpage=="Commentaires": 
+
+
+
+                        subpage = st.sidebar.selectbox("Classification des commentaires et occurences",["Bon commentaires", "Mauvais commentaires","Occurrences des Mots"])
+                        if 'df' in st.session_state:
+                            if subpage=="Bon commentaires":
+                                # Afficher les bons  commentaires 
+                                st.subheader('Tableau des Commentaires Positifs')
+                                paginated_table(results, good_comments, ['Commentaire', 'Sentiment', 'Score', 'Mots_Essentiels'], key='positifs', sort_column='Score', ascending=False)
+
+                                # Visualisation du nuage de mots pour les bons commentaires
+                                st.subheader('Nuage de Mots - Commentaires Positifs')
+                                show_wordcloud(cloud_counts(results, good_word_counts, 'positif', key='nuage_positifs'))
+
+                            elif subpage=="Mauvais commentaires":
+
+
+                                # Afficher les mauvais commentaires
+                                st.subheader('Tableau des Commentaires Négatifs')
+                                paginated_table(results, bad_comments, ['Commentaire', 'Sentiment', 'Score', 'Mots_Essentiels'], key='negatifs', sort_column='Score')
+
+                                # Visualisation du nuage de mots pour les mauvais commentaires
+                                st.subheader('Nuage de Mots - Commentaires Négatifs')
+                                show_wordcloud(cloud_counts(results, bad_word_counts, 'négatif', key='nuage_negatifs'))
+
+                            elif subpage == "Occurrences des Mots":
+                                st.markdown('<h2><i class="fas fa-word icon"></i> Occurrences des Mots</h2>', unsafe_allow_html=True)
+                                st.write(pd.DataFrame(word_counts.most_common(10), columns=['Mot', 'Occurrences']))
+                                with stage('graphique_mots'):
+                                    top_bar_chart(word_counts.most_common(10), 'Mot')
+
+                                # Expressions de plusieurs mots, estimées par des compteurs à mémoire bornée
+                                st.subheader('Expressions fréquentes')
+                                choice = st.radio("Taille des expressions", list(NGRAM_NAMES.values()), horizontal=True, key='taille_ngrammes')
+                                top = top_ngrams(results['ngram_counts'], next(n for n, name in NGRAM_NAMES.items() if name == choice))
+                                top_grams = top.most_common(10)
+                                st.write(pd.DataFrame([(gram, count, top.errors[gram]) for gram, count in top_grams],
+                                                      columns=['Expression', 'Occurrences', 'Surestimation max']))
+                                with stage('graphique_ngrammes'):
+                                    top_bar_chart(top_grams, 'Expression')
+
+                                # Recherche des commentaires contenant un mot, via l'index inversé construit pendant l'analyse
+                                st.subheader('Commentaires contenant un mot')
+                                query = st.text_input("Mot(s) à rechercher")
+                                sentiments = st.multiselect("Sentiments", SENTIMENTS, default=SENTIMENTS)
+                                opportunity = st.radio("Opportunité", ["Toutes", "Oui", "Non"], horizontal=True)
+                                if query:
+                                    start = time.perf_counter()
+                                    matches = df.iloc[search_rows(results, query)]
+                                    matches = matches[matches['Sentiment'].isin(sentiments)]
+                                    if opportunity != "Toutes":
+                                        matches = matches[matches['Opportunité'] == (opportunity == "Oui")]
+                                    st.caption(f"{len(matches)} commentaires trouvés en {(time.perf_counter() - start) * 1000:.0f} ms.")
+                                    paginated_table(results, matches, ['Commentaire', 'Sentiment', 'Mots_Essentiels', 'Opportunité'], key='recherche')
+
+
+            elif subpage == "Opportunités d'Amélioration":
+                # Ajout d'une icône et d'un style pour la sous-page "Opportunités d'Amélioration"
+                st.sidebar.markdown('<i class="fas fa-lightbulb icon-opportunities"></i>', unsafe_allow_html=True)
+
+                # Filtrer les opportunités avec un sentiment positif
+                positive_opportunities = df[(df['Opportunité'] == True) & (df['Sentiment'] == 'positif')]
+
+                # Filtrer les opportunités avec un sentiment négatif ou neutre
+                negative_neutral_opportunities = df[(df['Opportunité'] == True) & 
+                                                    ((df['Sentiment'] == 'négatif') | (df['Sentiment'] == 'neutre'))]
+
+                # Titre pour la section des opportunités d'amélioration
+                st.markdown('<div class="header">Suggestions ou améliorations</div>', unsafe_allow_html=True)
+
+                # Affichage des opportunités avec un sentiment négatif ou neutre
+                st.write("**Suggestions issues des commentaires négatifs ou neutres :**")
+                paginated_table(results, negative_neutral_opportunities, ['Commentaire', 'Sentiment', 'Mots_Essentiels', 'Expressions_Opportunité'], key='suggestions')
+
+                # (Optionnel) Affichage des opportunités avec un sentiment positif
+                st.write("**Opportunités identifiées parmi les commentaires positifs :**")
+                paginated_table(results, positive_opportunities, ['Commentaire', 'Sentiment', 'Mots_Essentiels', 'Expressions_Opportunité'], key='opportunites_positives')
+
+                # Fréquence des expressions d'amélioration détectées
+                st.write("**Expressions d'amélioration les plus fréquentes :**")
+                st.write(pd.DataFrame(phrase_counts.most_common(), columns=['Expression', 'Commentaires']))
+
+            elif subpage == "Tendances":
+                st.markdown('<div class="header"><i class="fas fa-chart-line"></i> Tendances par période</div>', unsafe_allow_html=True)
+                columns = [] if results.get('preview') else date_columns(df)
+                if results.get('preview'):
+                    st.info("Les tendances ne sont pas disponibles en mode flux (seul un aperçu des lignes est conservé).")
+                elif not columns:
+                    st.info("Aucune colonne de date détectée dans le fichier.")
+                else:
+                    col_date, col_period = st.columns(2)
+                    date_column = col_date.selectbox("Colonne de date", columns, key='tendances_colonne')
+                    period = col_period.radio("Période", list(PERIODS), horizontal=True, key='tendances_periode')
+                    rollups = trend_rollups(st.session_state.get('results_key') or st.session_state.get('file_hash'), results['rows'],
+                                            date_column, PERIODS[period], results)
+                    if not rollups['periods']:
+                        st.info("Aucune date lisible dans cette colonne.")
+                    else:
+                        # La plage ne fait que découper les agrégats déjà calculés
+                        start, end = st.select_slider("Plage", rollups['periods'], value=(rollups['periods'][0], rollups['periods'][-1]), key='tendances_plage')
+                        sentiments, opportunities, top_words = rollup_range(rollups, start, end)
+                        st.subheader('Sentiments par période')
+                        st.line_chart(sentiments)
+                        st.subheader("Opportunités d'amélioration par période")
+                        st.bar_chart(opportunities)
+                        st.subheader('Mots les plus fréquents sur la plage')
+                        st.write(top_words.head(10).rename_axis('Mot').reset_index())
+                        if rollups['undated']:
+                            st.caption(f"{rollups['undated']} commentaires sans date lisible ne sont pas comptés.")
+finally:
+    # Le profilage s'arrête même si la page ne va pas jusqu'au bout (st.stop, st.rerun, exception) :
+    # Streamlit réutilise ce fil pour les rafraîchissements suivants de la session
+    profile = stop_profile(profiler) if profiler is not None else None
+
+# Panneau de diagnostic : durée, lignes et mémoire de chaque étape exécutée pendant ce rafraîchissement
+if diagnostics:
+    st.sidebar.markdown('**Diagnostics des étapes**')
+    stage_table = pd.DataFrame(stage_records, columns=['etape', 'secondes', 'lignes', 'memoire_delta_octets'])
+    stage_table['memoire_delta_octets'] = stage_table['memoire_delta_octets'] / 2**20
+    st.sidebar.dataframe(stage_table.rename(columns={'etape': 'Étape', 'secondes': 'Secondes', 'lignes': 'Lignes', 'memoire_delta_octets': 'Mémoire (Mo)'}))
+    shared = shared_results().stats()
+    st.sidebar.caption(f"Résultats partagés : {shared['entrees']} fichiers pour {shared['sessions']} sessions, "
+                       f"{shared['octets'] / 2**20:.0f} Mo sur {shared['budget_octets'] / 2**20:.0f} Mo.")
+    if profile is not None:
+        with st.sidebar.expander("Profil cProfile"):
+            st.text(profile)
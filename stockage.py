@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from analyse import COUNTER_KEYS, LEXICON_FINGERPRINT, parquet_frame
+from ngrammes import SpaceSaving
+
+logger = logging.getLogger('analyse.stockage')
+
+# Dossier du stockage persistant des analyses et taille maximale avant éviction (configurables)
+STORE_DIR = os.environ.get('ANALYSE_STORE_DIR', '.analyse_store')
+STORE_MAX_BYTES = int(float(os.environ.get('ANALYSE_STORE_MAX_MB', '2048')) * 2**20)
+
+# Fichiers d'une entrée : le DataFrame compact, les identifiants de mots (et l'index inversé) et tout le reste en JSON
+FRAME_FILE = 'frame.parquet'
+TOKENS_FILE = 'tokens.npz'
+RESULTS_FILE = 'resultats.json'
+
+# Version du format des entrées : les entrées d'une autre version sont ignorées et recalculées
+STORE_VERSION = 6
+
+
+# Fonction pour obtenir le dossier d'une entrée (la clé est l'empreinte du fichier analysé)
+def entry_path(key, directory=None):
+    return os.path.join(directory or STORE_DIR, key)
+
+
+# Préfixe des clés de séries : une série est la seule copie de son historique, elle n'est jamais évincée
+SERIES_PREFIX = 'serie-'
+
+# Verrous des séries pour les sessions d'un même processus (le fichier verrou couvre les autres processus)
+_series_locks = {}
+_series_locks_guard = threading.Lock()
+
+
+# Fonction pour obtenir la clé d'une série alimentée par lots successifs (mode incrémental)
+def series_key(name):
+    return SERIES_PREFIX + re.sub(r'[^\w-]', '_', name.strip())
+
+
+# Verrou exclusif d'une série : deux ajouts de lots à la même série se font l'un après l'autre,
+# chacun relisant la série sous le verrou pour ne pas écraser le lot ajouté par l'autre
+@contextmanager
+def series_lock(key, directory=None):
+    directory = directory or STORE_DIR
+    os.makedirs(directory, exist_ok=True)
+    with _series_locks_guard:
+        lock = _series_locks.setdefault(key, threading.Lock())
+    with lock, open(os.path.join(directory, f".{key}.lock"), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# Fonction pour enregistrer des résultats compacts sur disque (écriture dans un dossier temporaire
+# puis renommage, pour qu'une entrée ne soit jamais lue à moitié écrite), puis appliquer l'éviction.
+# L'enregistrement est facultatif : en cas d'échec l'erreur est journalisée, les résultats restent
+# utilisables en mémoire et False est renvoyé.
+def save_results(key, results, directory=None, max_bytes=None):
+    try:
+        _write_results(key, results, directory or STORE_DIR)
+        evict(directory, STORE_MAX_BYTES if max_bytes is None else max_bytes, keep=key)
+    except Exception:
+        logger.exception("Impossible d'enregistrer l'analyse %s", key)
+        return False
+    return True
+
+
+def _write_results(key, results, directory):
+    os.makedirs(directory, exist_ok=True)
+    target = entry_path(key, directory)
+    tmp = os.path.join(directory, f".{key}.{uuid.uuid4().hex}.tmp")
+    os.makedirs(tmp)
+    try:
+        parquet_frame(results['df']).to_parquet(os.path.join(tmp, FRAME_FILE))
+        tokens = results['tokens']
+        index = results['index']
+        np.savez(os.path.join(tmp, TOKENS_FILE), offsets=tokens['offsets'], ids=tokens['ids'],
+                 index_rows=index['rows'], index_offsets=index['offsets'])
+        meta = {name: value for name, value in results.items() if name not in COUNTER_KEYS + ['df', 'tokens', 'index', 'ngram_counts']}
+        meta['version'] = STORE_VERSION
+        meta['lexique'] = LEXICON_FINGERPRINT
+        meta['vocabulary'] = tokens['vocabulary'].tolist()
+        meta['counters'] = {name: [(item, int(count)) for item, count in results[name].items()] for name in COUNTER_KEYS}
+        meta['ngram_counts'] = {n: {sentiment: sketch.to_dict() for sentiment, sketch in sketches.items()}
+                                for n, sketches in results['ngram_counts'].items()}
+        with open(os.path.join(tmp, RESULTS_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# Fonction pour recharger des résultats stockés (None s'ils sont absents ou illisibles, ou s'ils ont été
+# calculés avec un autre lexique). Avec any_lexicon=True ils sont renvoyés quand même : leur clé 'lexique'
+# indique alors l'empreinte du lexique utilisé, à comparer à LEXICON_FINGERPRINT.
+def load_results(key, directory=None, any_lexicon=False):
+    path = entry_path(key, directory)
+    try:
+        with open(os.path.join(path, RESULTS_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.pop('version', None) != STORE_VERSION:
+            return None
+        if meta.get('lexique') != LEXICON_FINGERPRINT and not any_lexicon:
+            return None
+        df = pd.read_parquet(os.path.join(path, FRAME_FILE))
+        with np.load(os.path.join(path, TOKENS_FILE)) as arrays:
+            tokens = {
+                'vocabulary': np.array(meta.pop('vocabulary'), dtype=object),
+                'offsets': arrays['offsets'],
+                'ids': arrays['ids'],
+            }
+            index = {'rows': arrays['index_rows'], 'offsets': arrays['index_offsets']}
+    except (OSError, ValueError, KeyError):
+        return None
+    # Date d'accès mise à jour pour l'éviction (la moins récemment utilisée part en premier)
+    os.utime(os.path.join(path, RESULTS_FILE))
+    counters = meta.pop('counters')
+    results = {name: Counter(dict(counters[name])) for name in COUNTER_KEYS}
+    results['ngram_counts'] = {int(n): {sentiment: SpaceSaving.from_dict(sketch) for sentiment, sketch in sketches.items()}
+                               for n, sketches in meta.pop('ngram_counts').items()}
+    results.update(meta, df=df, tokens=tokens, index=index)
+    return results
+
+
+# Fonction pour savoir si une entrée existe sur disque, lisible ou non
+def entry_exists(key, directory=None):
+    return os.path.isdir(entry_path(key, directory))
+
+
+# Fonction pour relire l'historique d'une série enregistrée dans une autre version du format
+# (seuls les commentaires et la liste des lots sont repris, pour être réanalysés) ; None s'il est illisible
+def load_series_history(key, directory=None):
+    path = entry_path(key, directory)
+    try:
+        with open(os.path.join(path, RESULTS_FILE), encoding='utf-8') as f:
+            lots = json.load(f)['lots']
+        df = pd.read_parquet(os.path.join(path, FRAME_FILE))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if 'Commentaire' not in df.columns or not isinstance(lots, list):
+        return None
+    return {'df': df, 'lots': lots}
+
+
+# Fonction pour calculer la taille d'une entrée en octets
+def entry_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+# Fonction pour supprimer les entrées les moins récemment utilisées tant que le stockage dépasse max_bytes
+# (les séries ne sont ni comptées ni supprimées)
+def evict(directory=None, max_bytes=None, keep=None):
+    directory = directory or STORE_DIR
+    max_bytes = STORE_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(directory):
+        return
+    entries = []
+    for key in os.listdir(directory):
+        path = os.path.join(directory, key)
+        if key.startswith(('.', SERIES_PREFIX)) or not os.path.isdir(path):
+            continue
+        results_file = os.path.join(path, RESULTS_FILE)
+        last_used = os.path.getmtime(results_file) if os.path.exists(results_file) else 0
+        entries.append((last_used, key, path, entry_size(path)))
+    total = sum(size for _, _, _, size in entries)
+    for _, key, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
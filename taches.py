@@ -0,0 +1,78 @@
+import threading
+import time
+
+from analyse import PARALLEL_MIN_ROWS, analyze_comments_parallel, append_results, compact_results, create_executor
+from stockage import save_results
+
+# États possibles d'une tâche d'analyse
+EN_COURS = 'en cours'
+TERMINEE = 'terminée'
+ANNULEE = 'annulée'
+ECHEC = 'échec'
+
+
+# Fonction pour lancer l'analyse d'un DataFrame dans un fil d'exécution en arrière-plan.
+# La tâche est un dictionnaire partagé avec les sessions : DataFrame analysé, progression, nombre de tranches
+# analysées et résultats compacts partiels (les tranches y sont ajoutées une à une, comme les lots du
+# mode incrémental), résultats finaux ou erreur, et un événement 'cancel' pour l'interrompre entre deux tranches.
+def start_job(df, key, workers=1, slices=20):
+    job = {
+        'key': key,
+        'df': df,
+        'status': EN_COURS,
+        'rows': len(df),
+        'rows_done': 0,
+        'parts': 0,
+        'results': None,
+        'error': None,
+        'started': time.time(),
+        'cancel': threading.Event(),
+        'partial': None,
+    }
+    thread = threading.Thread(target=_run_job, args=(job, df, workers, slices), daemon=True)
+    job['thread'] = thread
+    thread.start()
+    return job
+
+
+def _run_job(job, df, workers, slices):
+    executor = create_executor(workers) if workers > 1 and len(df) >= PARALLEL_MIN_ROWS else None
+    # Avec des processus, une tranche doit être assez grande pour être analysée en parallèle
+    size = max(-(-len(df) // slices), PARALLEL_MIN_ROWS if executor is not None else 10000)
+    try:
+        for start in range(0, max(len(df), 1), size):
+            if job['cancel'].is_set():
+                job['status'] = ANNULEE
+                return
+            part = compact_results(analyze_comments_parallel(df.iloc[start:start + size], workers, executor=executor))
+            # Lignes renumérotées à partir de 0 pour l'ajout, l'index d'origine est rétabli à la fin
+            part['df'] = part['df'].reset_index(drop=True)
+            job['partial'] = part if job['partial'] is None else append_results(job['partial'], part)
+            job['parts'] += 1
+            job['rows_done'] += part['rows']
+        results = dict(job['partial'], df=job['partial']['df'].set_axis(df.index),
+                       unique_rows=df['Commentaire'].fillna('').astype(str).nunique())
+        save_results(job['key'], results)
+        job['results'] = results
+        job['status'] = TERMINEE
+    except Exception as e:
+        job['error'] = e
+        job['status'] = ECHEC
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+# Fonction pour demander l'arrêt d'une tâche (prise en compte à la fin de la tranche en cours)
+def cancel_job(job):
+    job['cancel'].set()
+
+
+# Fonction pour obtenir la progression d'une tâche (entre 0 et 1)
+def job_progress(job):
+    return job['rows_done'] / job['rows'] if job['rows'] else 1.0
+
+
+# Fonction pour obtenir les résultats compacts partiels des tranches déjà analysées (None avant la première)
+def job_partial(job):
+    return job['partial']
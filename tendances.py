@@ -0,0 +1,89 @@
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from analyse import ANALYSIS_COLUMNS, SENTIMENTS
+
+# Périodes proposées pour les tendances (codes de période pandas)
+PERIODS = {'Semaine': 'W', 'Mois': 'M'}
+
+# Commentaire et colonnes produites par l'analyse, jamais proposés comme colonne de date
+_ANALYSIS_COLUMNS = {'Commentaire', *ANALYSIS_COLUMNS}
+_ISO_DATE = re.compile(r'^\s*\d{4}-\d{1,2}-\d{1,2}')
+
+
+# Fonction pour convertir une colonne de dates : chaque valeur distincte n'est convertie qu'une fois,
+# au format ISO (année en tête) ou sinon jour en premier (format français)
+def parse_dates(values):
+    codes, uniques = pd.factorize(values.astype(str))
+    uniques = pd.Series(uniques)
+    iso = uniques.str.match(_ISO_DATE).mean() >= 0.5 if len(uniques) else True
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        parsed = pd.to_datetime(uniques, errors='coerce', dayfirst=not iso)
+    dates = pd.Series(parsed.to_numpy()[codes], index=values.index)
+    return dates.where(codes >= 0)
+
+
+# Fonction pour trouver les colonnes qui contiennent des dates (au moins 80 % d'un échantillon)
+def date_columns(df, sample_size=200):
+    columns = []
+    for column in df.columns:
+        if column in _ANALYSIS_COLUMNS:
+            continue
+        sample = df[column].dropna().head(sample_size)
+        if len(sample) and (pd.api.types.is_datetime64_any_dtype(sample) or parse_dates(sample).notna().mean() >= 0.8):
+            columns.append(column)
+    return columns
+
+
+# Agrégats par période, calculés une seule fois : nombre de commentaires de chaque sentiment,
+# nombre d'opportunités et occurrences de chaque mot dans chaque période. Les mots sont comptés
+# à partir des identifiants de mots des résultats compacts (un entier par paire période/mot) et
+# toutes les paires présentes sont gardées, si bien que les totaux d'une plage sont exacts.
+def build_rollups(results, date_column, period):
+    df = results['df']
+    dates = df[date_column] if pd.api.types.is_datetime64_any_dtype(df[date_column]) else parse_dates(df[date_column])
+    valid = dates.notna().to_numpy()
+    buckets, periods = pd.factorize(dates[valid].dt.to_period(period), sort=True)
+    sentiments = pd.Categorical(df['Sentiment'], categories=SENTIMENTS).codes[valid]
+    known = sentiments >= 0
+    sentiment_counts = np.bincount(buckets[known] * len(SENTIMENTS) + sentiments[known], minlength=len(periods) * len(SENTIMENTS))
+    opportunities = np.bincount(buckets, weights=df['Opportunité'].to_numpy(dtype=bool)[valid], minlength=len(periods))
+    # Mots : période de chaque ligne répétée pour chacun de ses mots
+    tokens = results['tokens']
+    row_buckets = np.full(len(df), -1, dtype=np.int64)
+    row_buckets[valid] = buckets
+    token_buckets = np.repeat(row_buckets, np.diff(tokens['offsets']))
+    kept = token_buckets >= 0
+    vocabulary_size = max(len(tokens['vocabulary']), 1)
+    pairs, counts = np.unique(token_buckets[kept] * vocabulary_size + tokens['ids'][kept], return_counts=True)
+    labels = periods.astype(str)
+    return {
+        'periods': list(labels),
+        'sentiments': pd.DataFrame(sentiment_counts.reshape(len(periods), len(SENTIMENTS)), index=labels, columns=SENTIMENTS),
+        'opportunities': pd.Series(opportunities.astype(np.int64), index=labels, name='Opportunités'),
+        'words': {
+            'bucket': (pairs // vocabulary_size).astype(np.int32),
+            'word': (pairs % vocabulary_size).astype(np.int32),
+            'count': counts.astype(np.int64),
+            'vocabulary': tokens['vocabulary'],
+        },
+        'undated': int((~valid).sum()),
+    }
+
+
+# Fonction pour restreindre des agrégats à une plage de périodes et additionner les mots de la plage
+# (occurrences exactes de chaque mot, du plus fréquent au moins fréquent)
+def rollup_range(rollups, start, end):
+    periods = rollups['periods']
+    first, last = periods.index(start), periods.index(end)
+    selected = periods[first:last + 1]
+    words = rollups['words']
+    in_range = (words['bucket'] >= first) & (words['bucket'] <= last)
+    totals = np.bincount(words['word'][in_range], weights=words['count'][in_range], minlength=len(words['vocabulary']))
+    present = np.flatnonzero(totals)
+    top_words = pd.Series(totals[present].astype(np.int64), index=pd.Index(words['vocabulary'][present], name='Mot'), name='Occurrences')
+    return rollups['sentiments'].loc[selected], rollups['opportunities'].loc[selected], top_words.sort_values(ascending=False, kind='stable')
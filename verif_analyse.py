@@ -0,0 +1,150 @@
+import argparse
+import io
+import random
+import sys
+import unicodedata
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from analyse import (
+    COUNTER_KEYS, SENTIMENTS, analyze_comments, analyze_csv_in_chunks, analyze_sentiment, append_results, clean_comment, clean_comments,
+    compact_results, fold_accents, mark_clauses, score_comments, score_sentiment, stop_words,
+)
+from bench_analyse import generer_commentaires
+from ngrammes import count_ngrams_by_sentiment, ngrams
+
+# Commentaires dont le score est connu : la négation s'arrête à la fin de la proposition
+# et ne porte que sur le premier mot du lexique qui la suit
+SCORES_ATTENDUS = [
+    ("Pas cher, mais horrible", -1.0),
+    ("pas mauvais, très lent", 0.5),
+    ("Jamais déçu, super produit", 3.0),
+    ("pas excellent, très lent", -3.0),
+    ("pas très bon produit, horrible", -2.0),
+    ("Ce n'est pas du tout cher", 1.0),
+    ("pas de problème, trop lent", 0.0),
+]
+
+
+# Fonction pour vérifier les négations sur les commentaires de référence
+def verifier_negations(lignes):
+    for comment, attendu in SCORES_ATTENDUS:
+        score = score_sentiment(mark_clauses(comment))
+        assert score == attendu, f"« {comment} » : score {score}, attendu {attendu}"
+    assert analyze_sentiment("Pas cher, mais horrible") == 'négatif'
+    assert analyze_sentiment("Jamais déçu, super produit") == 'positif'
+
+
+# Fonction pour vérifier que le score en bloc est identique au score commentaire par commentaire
+def verifier_score_en_bloc(lignes):
+    comments = pd.concat([generer_commentaires(lignes), pd.Series([c for c, _ in SCORES_ATTENDUS] + ["", ",,", "pas"])],
+                         ignore_index=True)
+    normalized = clean_comments(comments, remove_stopwords=False, clauses=True)
+    assert normalized.tolist() == [mark_clauses(comment) for comment in comments], "clean_comments(clauses=True) diverge de mark_clauses"
+    assert np.allclose(score_comments(normalized), [score_sentiment(text) for text in normalized]), "score_comments diverge de score_sentiment"
+
+
+# Fonction pour vérifier le repliement des accents : chaque lettre latine accentuée donne sa
+# décomposition sans diacritiques, et le nettoyage en bloc reste identique au nettoyage ligne par
+# ligne sur des commentaires aléatoires (accents, majuscules, grec, séparateur \x00, stopwords)
+def verifier_replis_accents(lignes):
+    assert [fold_accents(word) for word in ["déçu", "Œuvre", "À", "naïve"]] == ["decu", "OEuvre", "A", "naive"]
+    for code in range(0xC0, 0x250):
+        reference = ''.join(char for char in unicodedata.normalize('NFKD', chr(code)) if not unicodedata.combining(char))
+        if reference != chr(code) and reference.isascii() and not any(char.isspace() for char in reference):
+            assert fold_accents(chr(code)) == reference, f"{chr(code)!r} replié en {fold_accents(chr(code))!r}"
+    alphabet = list("abcdeéàçÉÈ  \t\n,.!'ΣσΑİ\x00-_") + sorted(stop_words)
+    rng = random.Random(1)
+    rows = ["".join(rng.choice(alphabet) + (" " if rng.random() < .4 else "") for _ in range(rng.randint(0, 15)))
+            for _ in range(lignes)]
+    rows += ["", " ", "\x00", "Le Produit est TRÈS bien!", "ΑΣ", "de la", "cet"]
+    bloc = clean_comments(pd.Series(rows)).tolist()
+    ecarts = [(row, x, y) for row, x, y in zip(rows, bloc, map(clean_comment, rows)) if x != y]
+    assert not ecarts, f"clean_comments diverge de clean_comment : {ecarts[:3]}"
+
+
+# Fonction pour vérifier que les compteurs de n-grammes sans plafond atteint sont exacts
+# (comparaison avec un comptage naïf pondéré)
+def verifier_ngrammes_exacts(lignes):
+    cleaned = clean_comments(generer_commentaires(lignes))
+    sentiments = np.array(SENTIMENTS, dtype=object)[np.arange(lignes) % len(SENTIMENTS)]
+    weights = np.random.default_rng(0).integers(1, 4, lignes)
+    counts = count_ngrams_by_sentiment(cleaned, sentiments, SENTIMENTS, weights, max_bytes=10**9)
+    for n in counts:
+        attendu = {sentiment: Counter() for sentiment in SENTIMENTS}
+        for text, sentiment, weight in zip(cleaned, sentiments, weights):
+            for gram in ngrams(text, n):
+                attendu[sentiment][gram] += int(weight)
+        for sentiment, sketch in counts[n].items():
+            assert sketch.floor == 0 and sketch.counts == dict(attendu[sentiment]), f"comptage des {n}-grammes ({sentiment}) inexact"
+
+
+# Fonction pour vérifier le mode incrémental : un historique complété lot par lot (vocabulaire et
+# index inversé raccordés sans tri) est identique à l'analyse complète de toutes les lignes
+def verifier_ajout_incremental(lignes):
+    comments = generer_commentaires(lignes)
+    coupures = [0, lignes // 2, lignes // 2 + 1, (lignes * 3) // 4, lignes]
+    lots = [compact_results(analyze_comments(pd.DataFrame({'Commentaire': comments.iloc[start:end].reset_index(drop=True)})))
+            for start, end in zip(coupures, coupures[1:])]
+    serie = lots[0]
+    for lot in lots[1:]:
+        serie = append_results(serie, lot)
+    complet = compact_results(analyze_comments(pd.DataFrame({'Commentaire': comments})))
+    pd.testing.assert_frame_equal(serie['df'], complet['df'])
+    assert serie['tokens']['vocabulary'].tolist() == complet['tokens']['vocabulary'].tolist(), "vocabulaire différent"
+    for name in ['offsets', 'ids']:
+        assert np.array_equal(serie['tokens'][name], complet['tokens'][name]), f"tokens['{name}'] différent"
+    for name in ['rows', 'offsets']:
+        assert np.array_equal(serie['index'][name], complet['index'][name]), f"index['{name}'] différent"
+    for key in COUNTER_KEYS:
+        assert serie[key] == complet[key], f"compteur {key} différent"
+    # Les n-grammes ne sont comparés qu'en dessous du plafond mémoire (au-delà, les comptes sont estimés)
+    for n, sketches in complet['ngram_counts'].items():
+        for sentiment, sketch in sketches.items():
+            assert sketch.floor > 0 or serie['ngram_counts'][n][sentiment].counts == sketch.counts, f"{n}-grammes ({sentiment}) différents"
+    assert serie['rows'] == complet['rows']
+    assert serie['unique_rows'] == complet['unique_rows'], "commentaires distincts de la série mal comptés"
+
+
+# Fonction pour vérifier le comptage des commentaires distincts en mode flux : les doublons répartis
+# sur plusieurs blocs ne sont comptés qu'une fois (estimation à quelques pour cent près)
+def verifier_distincts_flux(lignes):
+    comments = generer_commentaires(lignes)
+    source = io.StringIO(pd.DataFrame({'Commentaire': pd.concat([comments, comments.iloc[:lignes // 2]])}).to_csv(index=False))
+    estimate = analyze_csv_in_chunks(source, chunksize=max(lignes // 7, 1))['unique_rows']
+    attendu = comments.nunique()
+    assert abs(estimate - attendu) <= 0.03 * attendu + 2, f"{estimate} commentaires distincts estimés, {attendu} attendus"
+
+
+VERIFICATIONS = {
+    'negations': verifier_negations,
+    'score_en_bloc': verifier_score_en_bloc,
+    'replis_accents': verifier_replis_accents,
+    'ngrammes_exacts': verifier_ngrammes_exacts,
+    'ajout_incremental': verifier_ajout_incremental,
+    'distincts_flux': verifier_distincts_flux,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vérifications de non-régression de l'analyse (assertions).")
+    parser.add_argument('--lignes', type=int, default=20000, help="Commentaires synthétiques utilisés par les vérifications en bloc")
+    parser.add_argument('verifications', nargs='*', choices=[[]] + list(VERIFICATIONS), help="Vérifications à lancer (toutes par défaut)")
+    args = parser.parse_args(argv)
+
+    echecs = 0
+    for nom in args.verifications or VERIFICATIONS:
+        try:
+            VERIFICATIONS[nom](args.lignes)
+        except AssertionError as e:
+            print(f"ÉCHEC {nom} : {e}")
+            echecs += 1
+        else:
+            print(f"ok    {nom}")
+    return 1 if echecs else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())